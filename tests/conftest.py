@@ -1,4 +1,8 @@
 import os
+import shutil
+import tempfile
+
+import pytest
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
@@ -37,3 +41,26 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def raise_on_repeated_queries(settings):
+    # N+1 в тестах — ошибка, а не строка в журнале.
+    settings.NPLUSONE_RAISE = True
+
+
+@pytest.fixture(scope='session')
+def cache_dir():
+    path = tempfile.mkdtemp(prefix='yatube_test_cache')
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(settings, cache_dir):
+    # Кэш тестов лежит в своём каталоге и не смешивается с кэшем
+    # запущенного сервера, как в core.test_runner.TestRunner.
+    settings.CACHES = {
+        alias: {**options, 'LOCATION': cache_dir}
+        for alias, options in settings.CACHES.items()
+    }
@@ -0,0 +1,82 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+TEST_OF_POST: int = 13
+
+
+class ApiViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer',
+                                            first_name='Лев')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        for i in range(TEST_OF_POST):
+            Post.objects.create(text=f'Пост {i}', author=cls.user,
+                                group=cls.group)
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_feeds_mirror_html_views(self):
+        urls = {
+            reverse('api:index'): None,
+            reverse('api:group_list', kwargs={'slug': 'group'}): 'group',
+            reverse('api:profile', kwargs={'username': 'writer'}): 'author',
+        }
+        for url, meta in urls.items():
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(len(data['results']), 10)
+                self.assertEqual(data['results'][0]['text'], 'Пост 12')
+                self.assertEqual(data['results'][0]['author'], 'writer')
+                if meta:
+                    self.assertIn(meta, data)
+        data = self.client.get(
+            reverse('api:profile', kwargs={'username': 'writer'})
+        ).json()
+        self.assertEqual(data['author']['posts_count'], TEST_OF_POST)
+
+    def test_cursor_walks_whole_feed(self):
+        texts = []
+        params = {}
+        while True:
+            data = self.client.get(reverse('api:index'), params).json()
+            texts.extend(post['text'] for post in data['results'])
+            if not data['next']:
+                break
+            params = {'after': data['next']}
+        self.assertEqual(
+            texts, [f'Пост {i}' for i in range(TEST_OF_POST - 1, -1, -1)]
+        )
+
+    def test_sparse_fields(self):
+        data = self.client.get(
+            reverse('api:index'), {'fields': 'text,group'}
+        ).json()
+        self.assertEqual(
+            data['results'][0], {'text': 'Пост 12', 'group': 'group'}
+        )
+        response = self.client.get(reverse('api:index'), {'fields': 'email'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_query_budget_and_not_found(self):
+        budgets = {
+            reverse('api:index'): 1,
+            reverse('api:group_list', kwargs={'slug': 'group'}): 2,
+            reverse('api:profile', kwargs={'username': 'writer'}): 2,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url), self.assertNumQueries(budget):
+                self.client.get(url)
+        response = self.client.get(
+            reverse('api:group_list', kwargs={'slug': 'missing'})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
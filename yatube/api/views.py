@@ -0,0 +1,109 @@
+"""JSON-версии лент index, group_posts и profile.
+
+Посты отдаются из строк values() без создания моделей и без рендеринга
+шаблонов. Параметр ?fields=text,author выбирает колонки, ?after=
+продолжает ленту с курсора из поля next прошлого ответа.
+"""
+from http import HTTPStatus
+
+from django.db.models import F
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from posts.models import Group, Post, User
+from posts.utils import CursorPaginator
+
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+# Без этих колонок нельзя построить курсор следующей страницы.
+CURSOR_FIELDS = ('id', 'pub_date')
+POSTS_PER_PAGE = 10
+
+
+def error(message, status):
+    return JsonResponse({'detail': message}, status=status)
+
+
+def requested_fields(request):
+    """Поля ответа из ?fields=; None, если среди них есть неизвестные."""
+    fields = request.GET.get('fields')
+    if not fields:
+        return list(POST_FIELDS)
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    if not fields or any(field not in POST_FIELDS for field in fields):
+        return None
+    return fields
+
+
+def posts_response(request, post_list, **extra):
+    fields = requested_fields(request)
+    if fields is None:
+        return error(
+            f'Допустимые поля: {", ".join(POST_FIELDS)}',
+            HTTPStatus.BAD_REQUEST,
+        )
+    lookups = {POST_FIELDS[field] for field in fields}
+    lookups.update(CURSOR_FIELDS)
+    rows = post_list.values(*lookups)
+    page = CursorPaginator(rows, POSTS_PER_PAGE).get_cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    storage = Post.image.field.storage
+    results = []
+    for row in page:
+        item = {field: row[POST_FIELDS[field]] for field in fields}
+        if item.get('image'):
+            item['image'] = storage.url(item['image'])
+        results.append(item)
+    return JsonResponse({
+        **extra,
+        'results': results,
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@require_GET
+def index(request):
+    return posts_response(request, Post.objects.all())
+
+
+@require_GET
+def group_posts(request, slug):
+    group = (
+        Group.objects.filter(slug=slug)
+        .values('id', 'title', 'slug', 'description', 'posts_count')
+        .first()
+    )
+    if group is None:
+        return error('Группа не найдена', HTTPStatus.NOT_FOUND)
+    return posts_response(
+        request, Post.objects.filter(group_id=group['id']), group=group
+    )
+
+
+@require_GET
+def profile(request, username):
+    author = (
+        User.objects.filter(username=username)
+        .values(
+            'id', 'username', 'first_name', 'last_name',
+            posts_count=F('stats__posts_count'),
+            followers_count=F('stats__followers_count'),
+            following_count=F('stats__following_count'),
+        )
+        .first()
+    )
+    if author is None:
+        return error('Пользователь не найден', HTTPStatus.NOT_FOUND)
+    return posts_response(
+        request, Post.objects.filter(author_id=author['id']), author=author
+    )
@@ -0,0 +1,46 @@
+from django.contrib import admin
+from django.utils.html import format_html
+
+from .models import RequestProfile
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'created',
+        'method',
+        'path',
+        'view_name',
+        'status',
+        'mode',
+        'duration',
+        'queries',
+        'user',
+    )
+    list_filter = ('mode', 'view_name')
+    search_fields = ('path',)
+    exclude = ('report',)
+    readonly_fields = (
+        'created',
+        'user',
+        'method',
+        'path',
+        'view_name',
+        'status',
+        'mode',
+        'duration',
+        'queries',
+        'sql_time',
+        'report_text',
+    )
+
+    def report_text(self, obj):
+        return format_html('<pre>{}</pre>', obj.report)
+    report_text.short_description = 'Отчёт'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
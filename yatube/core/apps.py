@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import instrumentation
+        from .slow_queries import install
+
+        instrumentation.install()
+        connection_created.connect(install, dispatch_uid='slow_queries')
@@ -0,0 +1,98 @@
+"""Замеры обработки запроса: число и время SQL, время рендеринга шаблонов,
+попадания в кэш фрагментов.
+
+measure() подключает к соединению execute_wrapper, а обёртка из
+install() считает время верхнеуровневого Template.render: вложенные
+include в сумму второй раз не попадают. SQL ленивых querysets,
+выполненный во время рендеринга, входит и в время SQL, и в время
+шаблонов.
+"""
+import math
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import connection
+from django.template.base import Template
+
+_local = threading.local()
+_original_render = Template.render
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.view_name = None
+        # (имя фрагмента, 'hit' или 'miss') -> число обращений.
+        self.fragments = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - started
+
+
+def _timed_render(self, context):
+    stats = getattr(_local, 'stats', None)
+    if stats is None:
+        return _original_render(self, context)
+    stats.template_depth += 1
+    started = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        stats.template_depth -= 1
+        if not stats.template_depth:
+            stats.template_time += time.perf_counter() - started
+
+
+def install():
+    """Ставит замер времени шаблонов; вызывается один раз из
+    CoreConfig.ready().
+
+    Без активного замера обёртка сразу зовёт исходный render, а замеры
+    хранятся в потоке, поэтому параллельные запросы друг другу не
+    мешают. Template._render не подходит: его подменяет тестовое
+    окружение Django.
+    """
+    if Template.render is not _timed_render:
+        Template.render = _timed_render
+
+
+def current_stats():
+    """Замеры текущего запроса этого потока или None."""
+    return getattr(_local, 'stats', None)
+
+
+@contextmanager
+def measure():
+    """Контекст, в котором SQL и шаблоны потока записываются в
+    RequestStats."""
+    stats = RequestStats()
+    previous = current_stats()
+    _local.stats = stats
+    try:
+        with connection.execute_wrapper(stats):
+            yield stats
+    finally:
+        _local.stats = previous
+        if previous is not None:
+            # SQL внешний замер видит сам через свой execute_wrapper, а
+            # шаблоны и фрагменты пишутся только во внутренний.
+            previous.template_time += stats.template_time
+            previous.fragments.update(stats.fragments)
+
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу; values должны быть отсортированы."""
+    if not values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(values)), 1)
+    return values[rank - 1]
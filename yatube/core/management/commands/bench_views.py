@@ -0,0 +1,207 @@
+import json
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from about import urls as about_urls
+from core.instrumentation import measure, percentile
+from posts import urls as posts_urls
+from posts.models import Follow, Post
+from users import urls as users_urls
+
+URL_MODULES = (posts_urls, users_urls, about_urls)
+
+# View, меняющие данные, в замеры не входят: их GET либо запрещён, либо
+# сам по себе подписывает и отписывает.
+WRITE_VIEWS = {
+    'posts:add_comment',
+    'posts:follow_bulk',
+    'posts:profile_follow',
+    'posts:profile_unfollow',
+}
+# Страницы входа и выхода открываются гостем: иначе logout разлогинил
+# бы клиента посреди прогона.
+GUEST_VIEWS = {'users:signup', 'users:login', 'users:logout'}
+
+SEED_SIZES = {
+    'users': 500,
+    'groups': 10,
+    'posts': 5000,
+    'comments': 10000,
+    'follows': 5000,
+}
+
+DUMMY_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет view из posts, users и about через тестовый клиент и '
+        'сравнивает результат с JSON-базой'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Замеров на каждый view')
+        parser.add_argument('--warmup', type=int, default=2,
+                            help='Запросов до замеров')
+        parser.add_argument('--seed', type=int,
+                            help='Замерять на данных seed_yatube с этим '
+                                 'seed; они откатываются после прогона')
+        parser.add_argument('--cold', action='store_true',
+                            help='Без кэша (DummyCache)')
+        parser.add_argument('--baseline',
+                            help='JSON-база для сравнения')
+        parser.add_argument('--save',
+                            help='Сохранить результаты как JSON-базу')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Допустимый рост p50/p95, доля от базы')
+        parser.add_argument('--min-delta', type=float, default=2.0,
+                            help='Рост в мс, который не считается '
+                                 'регрессией при любой доле')
+
+    def handle(self, *args, **options):
+        overrides = {'DEBUG': False}
+        if options['cold']:
+            overrides['CACHES'] = DUMMY_CACHES
+        with override_settings(**overrides), transaction.atomic():
+            if options['seed'] is not None:
+                call_command('seed_yatube', seed=options['seed'],
+                             prefix='bench', stdout=self.stderr,
+                             **SEED_SIZES)
+            results = self.run(options['repeat'], options['warmup'])
+            transaction.set_rollback(True)
+        # В кэше остались страницы и объекты откатанных данных.
+        cache.clear()
+
+        report = {
+            'meta': {
+                'repeat': options['repeat'],
+                'seed': options['seed'],
+                'cold': options['cold'],
+            },
+            'views': results,
+        }
+        self.print_report(results)
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            regressions = self.compare(
+                results, baseline['views'],
+                options['threshold'], options['min_delta'],
+            )
+            if regressions:
+                raise CommandError(
+                    'Регрессии:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def url_kwargs(self):
+        posts = Post.objects.select_related('author', 'group')
+        # Пост с группой, чтобы замерить и group_list.
+        post = (
+            posts.filter(group__isnull=False).order_by('-pk').first()
+            or posts.order_by('-pk').first()
+        )
+        if post is None:
+            raise CommandError('В базе нет постов: укажите --seed')
+        follow = Follow.objects.select_related('user').first()
+        reader = follow.user if follow else post.author
+        return reader, {
+            'post_id': post.pk,
+            'username': post.author.username,
+            'slug': post.group.slug if post.group else None,
+        }
+
+    def views(self, url_kwargs):
+        """Пары (имя, адрес) всех GET-view, для которых есть аргументы."""
+        for module in URL_MODULES:
+            for pattern in module.urlpatterns:
+                name = f'{module.app_name}:{pattern.name}'
+                names = pattern.pattern.converters.keys()
+                if name in WRITE_VIEWS or any(
+                    url_kwargs.get(key) is None for key in names
+                ):
+                    continue
+                yield name, reverse(
+                    name, kwargs={key: url_kwargs[key] for key in names}
+                )
+
+    def run(self, repeat, warmup):
+        reader, url_kwargs = self.url_kwargs()
+        reader_client = Client()
+        reader_client.force_login(reader)
+        guest_client = Client()
+        results = {}
+        for name, url in self.views(url_kwargs):
+            client = guest_client if name in GUEST_VIEWS else reader_client
+            for _ in range(warmup):
+                client.get(url)
+            latencies, queries, sql_times, template_times = [], [], [], []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                with measure() as stats:
+                    response = client.get(url)
+                latencies.append(time.perf_counter() - started)
+                queries.append(stats.queries)
+                sql_times.append(stats.sql_time)
+                template_times.append(stats.template_time)
+            latencies.sort()
+            results[name] = {
+                'url': url,
+                'status': response.status_code,
+                'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+                'queries': max(queries),
+                'sql_ms': round(statistics.median(sql_times) * 1000, 3),
+                'template_ms': round(
+                    statistics.median(template_times) * 1000, 3
+                ),
+            }
+        return results
+
+    def compare(self, results, baseline, threshold, min_delta):
+        regressions = []
+        for name, result in results.items():
+            old = baseline.get(name)
+            if old is None:
+                continue
+            if result['queries'] > old['queries']:
+                regressions.append(
+                    f"{name}: запросов {old['queries']} → "
+                    f"{result['queries']}"
+                )
+            for metric in ('p50_ms', 'p95_ms'):
+                delta = result[metric] - old[metric]
+                if delta > min_delta and delta > old[metric] * threshold:
+                    regressions.append(
+                        f'{name}: {metric} {old[metric]} → {result[metric]}'
+                    )
+        return regressions
+
+    def print_report(self, results):
+        self.stdout.write(
+            f"{'view':<28}{'код':>5}{'p50':>9}{'p95':>9}"
+            f"{'SQL':>6}{'SQL мс':>9}{'шабл мс':>9}"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<28}{result['status']:>5}"
+                f"{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+                f"{result['queries']:>6}{result['sql_ms']:>9.2f}"
+                f"{result['template_ms']:>9.2f}"
+            )
@@ -0,0 +1,313 @@
+"""Нагрузочный прогон через yatube.wsgi.application.
+
+Запросы собираются в WSGI-окружение и отдаются приложению целиком, со
+всеми middleware, из пула потоков или процессов. В режиме процессов
+воркеры, как воркеры gunicorn, делят файловый кэш из CACHES: промах
+одного воркера заполняет кэш для остальных. Прогон пишет в базу
+(комментарии и подписки), поэтому запускать его стоит на копии,
+наполненной seed_yatube.
+"""
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connections
+from django.middleware.csrf import CSRF_TOKEN_LENGTH
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from core.instrumentation import percentile
+from posts.models import Follow, Post, User
+
+DEFAULT_MIX = 'index=40,profile=20,follow_index=20,comment=10,follow=10'
+OPERATIONS = ('index', 'profile', 'follow_index', 'comment', 'follow')
+
+_local = threading.local()
+
+
+def remember_exception(sender, request=None, **kwargs):
+    _local.exception = sys.exc_info()[1]
+
+
+def is_lock_timeout(exception):
+    # SQLite отвечает так, когда не дождался блокировки писателя за
+    # timeout соединения.
+    return (isinstance(exception, OperationalError)
+            and 'locked' in str(exception))
+
+
+def init_worker():
+    # Соединения, унаследованные от родителя через fork, в дочернем
+    # процессе использовать нельзя.
+    connections.close_all()
+    got_request_exception.connect(
+        remember_exception, dispatch_uid='load_test'
+    )
+
+
+def build_environ(method, path, data, cookies, csrf_token):
+    body = urlencode(data).encode() if data else b''
+    return {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        # Не из INTERNAL_IPS: debug_toolbar не должен вмешиваться.
+        'REMOTE_ADDR': '10.0.0.1',
+        'HTTP_COOKIE': '; '.join(
+            f'{name}={value}' for name, value in cookies.items()
+        ),
+        'HTTP_X_CSRFTOKEN': csrf_token,
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+
+
+def run_operation(operation):
+    """Выполняет запрос; возвращает (операция, секунды, код, ошибка)."""
+    from yatube.wsgi import application
+
+    kind, method, path, data, cookies, csrf_token = operation
+    status = []
+    _local.exception = None
+    started = time.perf_counter()
+    response = application(
+        build_environ(method, path, data, cookies, csrf_token),
+        lambda code, headers, exc_info=None: status.append(code),
+    )
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    elapsed = time.perf_counter() - started
+    code = int(status[0].split()[0])
+    exception = _local.exception
+    error = None
+    if is_lock_timeout(exception):
+        error = 'lock_timeout'
+    elif exception is not None:
+        error = type(exception).__name__
+    elif code >= 400:
+        error = f'http_{code}'
+    return kind, elapsed, code, error
+
+
+def run_chunk(operations):
+    return [run_operation(operation) for operation in operations]
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise CommandError(
+                f'Неизвестная операция {name}; есть: {", ".join(OPERATIONS)}'
+            )
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Вес операции {name} должен быть числом')
+    if not any(weights.values()):
+        raise CommandError('Все веса нулевые')
+    return weights
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает WSGI-приложение смесью чтений и записей и выводит '
+        'пропускную способность, перцентили задержки и ошибки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--mode', choices=('thread', 'process'),
+                            default='thread')
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help='Веса операций: ' + DEFAULT_MIX)
+        parser.add_argument('--users', type=int, default=50,
+                            help='Сколько читателей залогинить')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', dest='json_path',
+                            help='Сохранить отчёт в JSON-файл')
+
+    def handle(self, *args, **options):
+        weights = parse_mix(options['mix'])
+        rng = random.Random(options['seed'])
+        with override_settings(DEBUG=False):
+            sessions = self.login(options['users'])
+            targets = self.targets()
+            operations = [
+                self.operation(rng, kind, sessions, targets)
+                for kind in rng.choices(
+                    list(weights), list(weights.values()),
+                    k=options['requests'],
+                )
+            ]
+            started = time.perf_counter()
+            results = self.replay(
+                operations, options['workers'], options['mode']
+            )
+            elapsed = time.perf_counter() - started
+        report = self.summarize(results, elapsed)
+        report['meta'] = {
+            'requests': options['requests'],
+            'workers': options['workers'],
+            'mode': options['mode'],
+            'mix': weights,
+            'seed': options['seed'],
+        }
+        self.print_report(report)
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def login(self, count):
+        """Сессии читателей с подписками: (cookies, csrf-токен)."""
+        reader_ids = list(
+            Follow.objects.order_by('user_id')
+            .values_list('user_id', flat=True).distinct()[:count]
+        )
+        readers = User.objects.order_by('pk')
+        if reader_ids:
+            readers = readers.filter(pk__in=reader_ids)
+        readers = readers[:count]
+        sessions = []
+        for reader in readers:
+            client = Client()
+            client.force_login(reader)
+            csrf_token = get_random_string(CSRF_TOKEN_LENGTH)
+            sessions.append(({
+                settings.SESSION_COOKIE_NAME:
+                    client.cookies[settings.SESSION_COOKIE_NAME].value,
+                settings.CSRF_COOKIE_NAME: csrf_token,
+            }, csrf_token))
+        if not sessions:
+            raise CommandError('В базе нет пользователей: '
+                               'запустите seed_yatube')
+        return sessions
+
+    def targets(self):
+        post_ids = list(
+            Post.objects.order_by('-pub_date')
+            .values_list('pk', flat=True)[:1000]
+        )
+        usernames = list(
+            User.objects.filter(posts__isnull=False)
+            .values_list('username', flat=True).distinct()[:1000]
+        )
+        if not post_ids:
+            raise CommandError('В базе нет постов: запустите seed_yatube')
+        return post_ids, usernames
+
+    def operation(self, rng, kind, sessions, targets):
+        post_ids, usernames = targets
+        cookies, csrf_token = rng.choice(sessions)
+        method, data = 'GET', None
+        if kind == 'index':
+            path = reverse('posts:index')
+        elif kind == 'profile':
+            path = reverse('posts:profile',
+                           kwargs={'username': rng.choice(usernames)})
+        elif kind == 'follow_index':
+            path = reverse('posts:follow_index')
+        elif kind == 'comment':
+            method = 'POST'
+            path = reverse('posts:add_comment',
+                           kwargs={'post_id': rng.choice(post_ids)})
+            data = {'text': f'Комментарий {rng.randrange(10 ** 6)}'}
+        else:
+            # Подписка и отписка поровну, чтобы граф не рос без предела.
+            view = rng.choice(('posts:profile_follow',
+                               'posts:profile_unfollow'))
+            path = reverse(view, kwargs={'username': rng.choice(usernames)})
+        return kind, method, path, data, cookies, csrf_token
+
+    def replay(self, operations, workers, mode):
+        if mode == 'process':
+            # Процессам задачи раздаются кусками: по одной их передача
+            # дороже самого запроса.
+            size = max(len(operations) // (workers * 4), 1)
+            chunks = [operations[start:start + size]
+                      for start in range(0, len(operations), size)]
+            with ProcessPoolExecutor(workers,
+                                     initializer=init_worker) as pool:
+                return [result for chunk in pool.map(run_chunk, chunks)
+                        for result in chunk]
+        got_request_exception.connect(
+            remember_exception, dispatch_uid='load_test'
+        )
+        try:
+            with ThreadPoolExecutor(workers) as pool:
+                return list(pool.map(run_operation, operations))
+        finally:
+            got_request_exception.disconnect(dispatch_uid='load_test')
+
+    def summarize(self, results, elapsed):
+        by_kind = defaultdict(list)
+        for result in results:
+            by_kind[result[0]].append(result)
+        by_kind['total'] = results
+        summary = {}
+        for kind, kind_results in by_kind.items():
+            latencies = sorted(result[1] for result in kind_results)
+            errors = Counter(
+                result[3] for result in kind_results if result[3]
+            )
+            summary[kind] = {
+                'requests': len(kind_results),
+                'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+                'p999_ms': round(percentile(latencies, 0.999) * 1000, 3),
+                'errors': sum(errors.values()),
+                'lock_timeouts': errors.pop('lock_timeout', 0),
+                'error_kinds': dict(errors),
+            }
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(results) / elapsed, 1)
+            if elapsed else 0.0,
+            'operations': summary,
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['throughput_rps']} запросов/с "
+            f"за {report['elapsed_s']} с"
+        )
+        self.stdout.write(
+            f"{'операция':<14}{'запросов':>9}{'p50':>9}{'p99':>9}"
+            f"{'p999':>9}{'ошибок':>8}{'блокир':>8}"
+        )
+        for kind, row in report['operations'].items():
+            self.stdout.write(
+                f"{kind:<14}{row['requests']:>9}{row['p50_ms']:>9.2f}"
+                f"{row['p99_ms']:>9.2f}{row['p999_ms']:>9.2f}"
+                f"{row['errors']:>8}{row['lock_timeouts']:>8}"
+            )
+            if row['error_kinds']:
+                self.stdout.write(f"  {row['error_kinds']}")
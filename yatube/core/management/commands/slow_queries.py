@@ -0,0 +1,83 @@
+import json
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводит журнал медленных запросов в список худших отпечатков по '
+        'суммарному времени'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=None,
+                            help='Журнал; по умолчанию SLOW_QUERY_LOG')
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--json', dest='json_path',
+                            help='Сохранить отчёт в JSON-файл')
+
+    def handle(self, *args, **options):
+        path = options['log'] or settings.SLOW_QUERY_LOG
+        if path is None:
+            raise CommandError('Журнал выключен: SLOW_QUERY_LOG = None')
+        try:
+            with open(path, encoding='utf-8') as log:
+                offenders = self.aggregate(log)
+        except FileNotFoundError:
+            raise CommandError(f'Нет журнала {path}')
+        report = sorted(
+            offenders.values(), key=lambda row: row['total'], reverse=True
+        )[:options['limit']]
+        self.print_report(report)
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def aggregate(self, log):
+        offenders = {}
+        views = defaultdict(Counter)
+        for line in log:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            key = entry['fingerprint']
+            row = offenders.get(key)
+            if row is None:
+                row = offenders[key] = {
+                    'fingerprint': key,
+                    'count': 0,
+                    'total': 0.0,
+                    'max': 0.0,
+                }
+            row['count'] += 1
+            row['total'] += entry['duration']
+            views[key][entry.get('view') or '-'] += 1
+            if entry['duration'] >= row['max']:
+                # Для отпечатка показывается самый медленный образец.
+                row['max'] = entry['duration']
+                row['sql'] = entry['sql']
+                row['plan'] = entry.get('plan', [])
+        for key, row in offenders.items():
+            row['total'] = round(row['total'], 6)
+            row['mean'] = round(row['total'] / row['count'], 6)
+            row['views'] = dict(views[key].most_common())
+        return offenders
+
+    def print_report(self, report):
+        if not report:
+            self.stdout.write('Медленных запросов нет')
+        for number, row in enumerate(report, 1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{number}. {row['total']:.3f} с всего, {row['count']} раз, "
+                f"в среднем {row['mean'] * 1000:.1f} мс, "
+                f"максимум {row['max'] * 1000:.1f} мс"
+            ))
+            self.stdout.write(f"  {row['fingerprint'][:200]}")
+            self.stdout.write('  view: ' + ', '.join(
+                f'{view} ({count})' for view, count in row['views'].items()
+            ))
+            for step in row['plan']:
+                self.stdout.write(f'    {step}')
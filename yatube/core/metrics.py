@@ -0,0 +1,111 @@
+"""Метрики запросов в памяти процесса и их текстовый формат.
+
+Счётчики у каждого воркера свои: сборщик опрашивает воркеры по
+отдельности и складывает значения сам.
+"""
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+# Границы корзин гистограммы задержек, секунды.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Имя для запросов, которые не дошли до view (404 при разборе адреса).
+UNRESOLVED = 'unresolved'
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.duration = 0.0
+        self.statuses = Counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.views = defaultdict(ViewMetrics)
+            self.fragments = Counter()
+
+    def observe(self, view, duration, status, stats):
+        with self._lock:
+            metrics = self.views[view]
+            metrics.buckets[bisect_left(BUCKETS, duration)] += 1
+            metrics.duration += duration
+            metrics.statuses[status] += 1
+            metrics.queries += stats.queries
+            metrics.sql_time += stats.sql_time
+            metrics.template_time += stats.template_time
+            self.fragments.update(stats.fragments)
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        with self._lock:
+            views = sorted(self.views.items())
+            fragments = sorted(self.fragments.items())
+        lines = [
+            '# HELP yatube_request_duration_seconds Время обработки запроса.',
+            '# TYPE yatube_request_duration_seconds histogram',
+        ]
+        for view, metrics in views:
+            total = 0
+            bounds = [str(bound) for bound in BUCKETS] + ['+Inf']
+            for bound, count in zip(bounds, metrics.buckets):
+                total += count
+                lines.append(
+                    'yatube_request_duration_seconds_bucket'
+                    f'{{view="{view}",le="{bound}"}} {total}'
+                )
+            lines.append(
+                f'yatube_request_duration_seconds_sum{{view="{view}"}} '
+                f'{metrics.duration:.6f}'
+            )
+            lines.append(
+                f'yatube_request_duration_seconds_count{{view="{view}"}} '
+                f'{total}'
+            )
+        lines += [
+            '# HELP yatube_responses_total Ответы по кодам.',
+            '# TYPE yatube_responses_total counter',
+        ]
+        for view, metrics in views:
+            for status, count in sorted(metrics.statuses.items()):
+                lines.append(
+                    f'yatube_responses_total{{view="{view}",'
+                    f'status="{status}"}} {count}'
+                )
+        for name, attribute, help_text, number_format in (
+            ('yatube_sql_queries_total', 'queries',
+             'Число SQL-запросов.', 'd'),
+            ('yatube_sql_duration_seconds_total', 'sql_time',
+             'Время SQL-запросов.', '.6f'),
+            ('yatube_template_duration_seconds_total', 'template_time',
+             'Время рендеринга шаблонов.', '.6f'),
+        ):
+            lines += [f'# HELP {name} {help_text}',
+                      f'# TYPE {name} counter']
+            for view, metrics in views:
+                value = getattr(metrics, attribute)
+                lines.append(
+                    f'{name}{{view="{view}"}} {value:{number_format}}'
+                )
+        lines += [
+            '# HELP yatube_fragment_cache_total Обращения к {% cache %}.',
+            '# TYPE yatube_fragment_cache_total counter',
+        ]
+        for (fragment, result), count in fragments:
+            lines.append(
+                f'yatube_fragment_cache_total{{fragment="{fragment}",'
+                f'result="{result}"}} {count}'
+            )
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -0,0 +1,63 @@
+import time
+
+from .instrumentation import current_stats, measure
+from .metrics import UNRESOLVED, registry
+from .nplusone import detect_repeated_queries
+from .profiling import profile_request, requested_mode
+
+
+class RequestMetricsMiddleware:
+    """Пишет в реестр метрик время запроса, SQL, шаблоны и обращения к
+    кэшу фрагментов под именем URL вида 'posts:index'."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with measure() as stats:
+            response = self.get_response(request)
+        match = request.resolver_match
+        registry.observe(
+            match.view_name if match else UNRESOLVED,
+            time.perf_counter() - started,
+            response.status_code,
+            stats,
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Имя view нужно журналу медленных запросов уже во время работы
+        # view.
+        stats = current_stats()
+        if stats is not None:
+            stats.view_name = request.resolver_match.view_name
+
+
+class RepeatedQueriesMiddleware:
+    """Ищет повторы одного запроса за время обработки запроса к сайту."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with detect_repeated_queries() as detector:
+            response = self.get_response(request)
+        if detector is not None:
+            match = request.resolver_match
+            detector.check(match.view_name if match else request.path)
+        return response
+
+
+class ProfilingMiddleware:
+    """Снимает профиль запроса, если его попросил сотрудник; ставится
+    после AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        return profile_request(self.get_response, request, mode)
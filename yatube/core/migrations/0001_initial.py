@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Снят')),
+                ('method', models.CharField(max_length=10, verbose_name='Метод')),
+                ('path', models.CharField(max_length=2000, verbose_name='Адрес')),
+                ('view_name', models.CharField(blank=True, max_length=200, verbose_name='View')),
+                ('status', models.PositiveSmallIntegerField(verbose_name='Код ответа')),
+                ('mode', models.CharField(choices=[('cprofile', 'cProfile, все вызовы'), ('sample', 'Снимки стека')], max_length=10, verbose_name='Режим')),
+                ('duration', models.FloatField(verbose_name='Длительность, с')),
+                ('queries', models.PositiveIntegerField(default=0, verbose_name='SQL-запросов')),
+                ('sql_time', models.FloatField(default=0, verbose_name='Время SQL, с')),
+                ('report', models.TextField(verbose_name='Отчёт')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+                'ordering': ['-created'],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+User = get_user_model()
+
+
+class RequestProfile(models.Model):
+    """Профиль запроса, снятый по просьбе сотрудника."""
+    MODE_CPROFILE = 'cprofile'
+    MODE_SAMPLE = 'sample'
+    MODES = (
+        (MODE_CPROFILE, 'cProfile, все вызовы'),
+        (MODE_SAMPLE, 'Снимки стека'),
+    )
+
+    created = models.DateTimeField('Снят', auto_now_add=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        verbose_name='Сотрудник'
+    )
+    method = models.CharField('Метод', max_length=10)
+    path = models.CharField('Адрес', max_length=2000)
+    view_name = models.CharField('View', max_length=200, blank=True)
+    status = models.PositiveSmallIntegerField('Код ответа')
+    mode = models.CharField('Режим', max_length=10, choices=MODES)
+    duration = models.FloatField('Длительность, с')
+    queries = models.PositiveIntegerField('SQL-запросов', default=0)
+    sql_time = models.FloatField('Время SQL, с', default=0)
+    report = models.TextField('Отчёт')
+
+    class Meta:
+        verbose_name_plural = 'Профили запросов'
+        verbose_name = 'Профиль запроса'
+        ordering = ['-created']
+
+    def __str__(self):
+        return f'{self.method} {self.path}'
@@ -0,0 +1,94 @@
+"""Поиск N+1: один и тот же запрос много раз за один запрос к сайту.
+
+Запросы сравниваются по отпечатку из slow_queries, то есть без значений
+параметров. Когда отпечаток повторяется больше NPLUSONE_THRESHOLD раз,
+запоминается, откуда пришёл следующий повтор: узел шаблона со строкой
+или, вне шаблонов, стек кода проекта. С NPLUSONE_RAISE находка
+поднимает RepeatedQueriesError (так работают тесты), иначе пишется в
+журнал.
+"""
+import inspect
+import logging
+import os
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+from .slow_queries import fingerprint
+
+logger = logging.getLogger('yatube.nplusone')
+
+# Сколько кадров кода проекта показывать, если запрос не из шаблона.
+STACK_DEPTH = 5
+
+
+class RepeatedQueriesError(AssertionError):
+    pass
+
+
+def query_origin():
+    """Узел шаблона, который выполняет запрос, или стек кода проекта."""
+    frame = inspect.currentframe()
+    try:
+        while frame is not None:
+            if frame.f_code.co_name == 'render_annotated':
+                node = frame.f_locals.get('self')
+                origin = getattr(node, 'origin', None)
+                token = getattr(node, 'token', None)
+                if origin is not None and token is not None:
+                    name = origin.template_name or origin.name
+                    return f'{name}, строка {token.lineno}: {token.contents}'
+            frame = frame.f_back
+    finally:
+        del frame
+    project_frames = [
+        f'{os.path.relpath(entry.filename, settings.BASE_DIR)}:'
+        f'{entry.lineno} {entry.name}'
+        for entry in traceback.extract_stack()
+        if entry.filename.startswith(settings.BASE_DIR)
+        and entry.filename != __file__
+        and 'site-packages' not in entry.filename
+    ]
+    return ' <- '.join(reversed(project_frames[-STACK_DEPTH:]))
+
+
+class RepeatedQueryDetector:
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = Counter()
+        self.origins = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        key = fingerprint(sql)
+        self.counts[key] += 1
+        if self.counts[key] == self.threshold + 1:
+            self.origins[key] = query_origin()
+        return execute(sql, params, many, context)
+
+    def check(self, label):
+        if not self.origins:
+            return
+        message = '\n'.join(
+            f'{label}: запрос выполнен {self.counts[key]} раз, '
+            f'повтор из {origin}\n  {key}'
+            for key, origin in self.origins.items()
+        )
+        if settings.NPLUSONE_RAISE:
+            raise RepeatedQueriesError(message)
+        logger.warning(message)
+
+
+@contextmanager
+def detect_repeated_queries():
+    """Контекст, собирающий отпечатки запросов; None, если поиск
+    выключен (NPLUSONE_THRESHOLD = None)."""
+    threshold = settings.NPLUSONE_THRESHOLD
+    if threshold is None:
+        yield None
+        return
+    detector = RepeatedQueryDetector(threshold)
+    with connection.execute_wrapper(detector):
+        yield detector
@@ -0,0 +1,158 @@
+"""Профилирование отдельных запросов по просьбе сотрудника.
+
+Профиль снимается, если сотрудник передал заголовок X-Yatube-Profile
+или параметр ?_profile= со значением режима:
+
+- cprofile — cProfile видит каждый вызов, но замедляет запрос в разы;
+- sample — отдельный поток раз в PROFILE_SAMPLE_INTERVAL секунд снимает
+  стек потока запроса. Накладные расходы ограничены частотой снимков и
+  не зависят от числа вызовов, поэтому режим годится для горячих
+  страниц и выбран для значения «1».
+
+Отчёт сохраняется в RequestProfile вместе с данными запроса; последние
+PROFILE_KEEP профилей видны в админке.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from .instrumentation import current_stats
+from .models import RequestProfile
+
+HEADER = 'HTTP_X_YATUBE_PROFILE'
+QUERY_PARAMETER = '_profile'
+RESPONSE_HEADER = 'X-Yatube-Profile-Id'
+MODES = {
+    '1': RequestProfile.MODE_SAMPLE,
+    RequestProfile.MODE_SAMPLE: RequestProfile.MODE_SAMPLE,
+    RequestProfile.MODE_CPROFILE: RequestProfile.MODE_CPROFILE,
+}
+# Строк в каждой таблице отчёта.
+REPORT_LINES = 40
+
+
+def requested_mode(request):
+    """Режим профилирования или None, если профиль не нужен."""
+    value = request.META.get(HEADER) or request.GET.get(QUERY_PARAMETER)
+    if not value or not request.user.is_staff:
+        return None
+    return MODES.get(value.lower())
+
+
+def frame_label(code):
+    path = '/'.join(code.co_filename.split(os.sep)[-2:])
+    return f'{code.co_name} ({path}:{code.co_firstlineno})'
+
+
+class StackSampler:
+    """Снимает стек потока, создавшего сэмплер, пока открыт контекст."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name='profile-sampler', daemon=True
+        )
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def report(self):
+        total = sum(self.samples.values())
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.samples.items():
+            functions = stack.split(';')
+            own[functions[-1]] += count
+            for function in set(functions):
+                inclusive[function] += count
+        lines = [f'Снимков: {total}, интервал {self.interval * 1000:g} мс']
+        for title, counter in (('Собственное время', own),
+                               ('Время с вложенными вызовами', inclusive)):
+            lines += ['', f'{title}:']
+            lines += [
+                f'{count * 100 / total:6.1f}%  {function}'
+                for function, count in counter.most_common(REPORT_LINES)
+            ]
+        # Формат collapsed stacks для flamegraph.pl и speedscope.
+        lines += ['', 'Стеки:']
+        lines += [f'{stack} {count}' for stack, count
+                  in self.samples.most_common(REPORT_LINES)]
+        return '\n'.join(lines)
+
+
+def run_cprofile(get_response, request):
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        response = get_response(request)
+    finally:
+        profile.disable()
+    output = io.StringIO()
+    stats = pstats.Stats(profile, stream=output)
+    stats.sort_stats('cumulative').print_stats(REPORT_LINES)
+    stats.sort_stats('tottime').print_stats(REPORT_LINES)
+    return response, output.getvalue()
+
+
+def run_sampler(get_response, request):
+    with StackSampler(settings.PROFILE_SAMPLE_INTERVAL) as sampler:
+        response = get_response(request)
+    return response, sampler.report()
+
+
+RUNNERS = {
+    RequestProfile.MODE_CPROFILE: run_cprofile,
+    RequestProfile.MODE_SAMPLE: run_sampler,
+}
+
+
+def profile_request(get_response, request, mode):
+    stats = current_stats()
+    queries_before = stats.queries if stats else 0
+    sql_before = stats.sql_time if stats else 0.0
+    started = time.perf_counter()
+    response, report = RUNNERS[mode](get_response, request)
+    duration = time.perf_counter() - started
+    match = request.resolver_match
+    profile = RequestProfile.objects.create(
+        user=request.user,
+        method=request.method,
+        path=request.get_full_path()[:2000],
+        view_name=match.view_name if match else '',
+        status=response.status_code,
+        mode=mode,
+        duration=duration,
+        queries=stats.queries - queries_before if stats else 0,
+        sql_time=stats.sql_time - sql_before if stats else 0.0,
+        report=report,
+    )
+    stale = RequestProfile.objects.values_list('pk', flat=True)[
+        settings.PROFILE_KEEP:
+    ]
+    RequestProfile.objects.filter(pk__in=list(stale)).delete()
+    response[RESPONSE_HEADER] = str(profile.pk)
+    return response
@@ -0,0 +1,88 @@
+"""Журнал медленных SQL-запросов.
+
+execute_wrapper ставится на каждое новое соединение и пишет запросы
+дольше SLOW_QUERY_THRESHOLD секунд в SLOW_QUERY_LOG, по JSON-строке на
+запрос: время, длительность, отпечаток, текст, view и план SELECT. Отчёт
+по журналу строит команда slow_queries.
+"""
+import json
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .instrumentation import current_stats
+
+logger = logging.getLogger('yatube.slow_queries')
+
+# Запросы пишутся из разных потоков одного процесса.
+_write_lock = threading.Lock()
+
+LITERALS_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s|\?")
+IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+SPACES_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Текст запроса без значений: запросы, отличающиеся только
+    параметрами и длиной списков IN, дают одну строку."""
+    sql = LITERALS_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('(...)', sql)
+    return SPACES_RE.sub(' ', sql).strip()
+
+
+def explain(connection, sql, params):
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return []
+    # Курсор драйвера минует execute_wrapper: план не попадает ни в
+    # журнал, ни в счётчики запросов.
+    with connection.cursor() as cursor:
+        cursor.cursor.execute(
+            f'{connection.ops.explain_query_prefix()} {sql}', params or ()
+        )
+        return [str(row[-1]) for row in cursor.fetchall()]
+
+
+def record(connection, sql, params, duration):
+    stats = current_stats()
+    try:
+        plan = explain(connection, sql, params)
+    except Exception as error:
+        plan = [f'EXPLAIN не выполнен: {error}']
+    entry = {
+        'time': timezone.now().isoformat(),
+        'duration': round(duration, 6),
+        'fingerprint': fingerprint(sql),
+        'sql': sql,
+        'view': getattr(stats, 'view_name', None),
+        'plan': plan,
+    }
+    logger.warning('Медленный запрос %.3f с в %s: %s',
+                   duration, entry['view'], entry['fingerprint'])
+    line = json.dumps(entry, ensure_ascii=False) + '\n'
+    with _write_lock, open(settings.SLOW_QUERY_LOG, 'a',
+                           encoding='utf-8') as log:
+        log.write(line)
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_THRESHOLD
+    if threshold is None or settings.SLOW_QUERY_LOG is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - started
+    if duration >= threshold and not many:
+        record(context['connection'], sql, params, duration)
+    return result
+
+
+def install(sender, connection, **kwargs):
+    """Обработчик connection_created."""
+    if slow_query_wrapper not in connection.execute_wrappers:
+        # В начало списка: execute_wrapper() снимает последнюю обёртку,
+        # а соединение может открыться внутри measure().
+        connection.execute_wrappers.insert(0, slow_query_wrapper)
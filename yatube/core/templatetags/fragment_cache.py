@@ -0,0 +1,47 @@
+"""{% cache %} со счётом попаданий в кэш фрагментов для метрик запроса.
+
+Тег разбирается встроенным do_cache; содержимое фрагмента рендерится
+только при промахе, поэтому промахи считает его NodeList.
+"""
+from django import template
+from django.templatetags.cache import CacheNode
+from django.templatetags.cache import do_cache as django_do_cache
+
+from core.instrumentation import current_stats
+
+register = template.Library()
+
+
+class MissCountingNodeList(template.NodeList):
+    fragment_name = None
+
+    def render(self, context):
+        stats = current_stats()
+        if stats is not None:
+            stats.fragments[(self.fragment_name, 'miss')] += 1
+        return super().render(context)
+
+
+class CountedCacheNode(CacheNode):
+    def render(self, context):
+        stats = current_stats()
+        if stats is None:
+            return super().render(context)
+        miss = (self.fragment_name, 'miss')
+        misses = stats.fragments[miss]
+        value = super().render(context)
+        if stats.fragments[miss] == misses:
+            stats.fragments[(self.fragment_name, 'hit')] += 1
+        return value
+
+
+@register.tag('cache')
+def do_cache(parser, token):
+    node = django_do_cache(parser, token)
+    nodelist = MissCountingNodeList(node.nodelist)
+    nodelist.contains_nontext = node.nodelist.contains_nontext
+    nodelist.fragment_name = node.fragment_name
+    return CountedCacheNode(
+        nodelist, node.expire_time_var, node.fragment_name,
+        node.vary_on, node.cache_name,
+    )
@@ -0,0 +1,28 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Тесты падают на N+1, а не только пишут о нём в журнал, и держат
+    кэш в своём каталоге, не трогая кэш запущенного сервера."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp(prefix='yatube_test_cache')
+        caches = {
+            alias: {**options, 'LOCATION': self.cache_dir}
+            for alias, options in settings.CACHES.items()
+        }
+        self.test_settings = override_settings(
+            NPLUSONE_RAISE=True, CACHES=caches
+        )
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,131 @@
+import json
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post
+
+from ..slow_queries import fingerprint
+
+User = get_user_model()
+
+
+class BenchViewsCommandTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        reader = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=reader, author=author)
+        Post.objects.create(text='Пост', author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bench_views_fails_on_query_regression(self):
+        with tempfile.NamedTemporaryFile(suffix='.json') as baseline_file:
+            call_command('bench_views', repeat=1, warmup=0,
+                         save=baseline_file.name, stdout=StringIO())
+            with open(baseline_file.name, encoding='utf-8') as file:
+                baseline = json.load(file)
+            views = baseline['views']
+            self.assertEqual(views['posts:index']['status'], 200)
+            self.assertIn('users:login', views)
+            self.assertIn('about:tech', views)
+            self.assertGreater(views['posts:profile']['template_ms'], 0)
+            # Один замер шумит, поэтому время здесь не сравнивается.
+            call_command('bench_views', repeat=1, warmup=0, threshold=1000,
+                         baseline=baseline_file.name, stdout=StringIO())
+            views['posts:follow_index']['queries'] = 0
+            with open(baseline_file.name, 'w', encoding='utf-8') as file:
+                json.dump(baseline, file)
+            with self.assertRaisesMessage(CommandError,
+                                          'posts:follow_index: запросов'):
+                call_command('bench_views', repeat=1, warmup=0,
+                             threshold=1000, baseline=baseline_file.name,
+                             stdout=StringIO())
+
+
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_fingerprint_drops_values(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, 3)\n"
+                        "  AND name = 'it''s' LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?',
+        )
+
+    def test_slow_queries_are_logged_and_reported(self):
+        url = reverse('posts:profile',
+                      kwargs={'username': self.author.username})
+        with tempfile.NamedTemporaryFile(suffix='.log') as log_file:
+            with override_settings(SLOW_QUERY_THRESHOLD=0,
+                                   SLOW_QUERY_LOG=log_file.name):
+                self.guest_client.get(url)
+            with open(log_file.name, encoding='utf-8') as log:
+                entries = [json.loads(line) for line in log]
+            post_entries = [
+                entry for entry in entries
+                if entry['view'] == 'posts:profile'
+                and 'FROM "posts_post"' in entry['sql']
+            ]
+            self.assertTrue(post_entries)
+            self.assertTrue(post_entries[0]['plan'])
+            with tempfile.NamedTemporaryFile(suffix='.json') as report_file:
+                call_command('slow_queries', log=log_file.name,
+                             json=report_file.name, stdout=StringIO())
+                with open(report_file.name, encoding='utf-8') as file:
+                    report = json.load(file)
+        offender = next(
+            row for row in report
+            if row['fingerprint'] == post_entries[0]['fingerprint']
+        )
+        self.assertIn('posts:profile', offender['views'])
+        self.assertEqual(offender['plan'], post_entries[0]['plan'])
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_LOG=None)
+    def test_log_can_be_disabled(self):
+        self.guest_client.get(reverse('posts:index'))
+        with self.assertRaisesMessage(CommandError, 'Журнал выключен'):
+            call_command('slow_queries', stdout=StringIO())
+
+
+class LoadTestCommandTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text='Пост', author=self.author)
+
+    def test_load_test_replays_reads_and_writes(self):
+        with tempfile.NamedTemporaryFile(suffix='.json') as report_file:
+            # Один воркер: потоки тестовой базы в памяти делят её кэш и
+            # блокировали бы друг друга.
+            call_command('load_test', requests=40, workers=1,
+                         json=report_file.name, stdout=StringIO())
+            with open(report_file.name, encoding='utf-8') as file:
+                report = json.load(file)
+        total = report['operations']['total']
+        self.assertEqual(total['requests'], 40)
+        self.assertEqual(total['errors'], 0)
+        self.assertGreater(report['throughput_rps'], 0)
+        self.assertEqual(
+            Comment.objects.count(),
+            report['operations'].get('comment', {}).get('requests', 0),
+        )
@@ -0,0 +1,173 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from ..instrumentation import measure
+from ..metrics import registry
+from ..models import RequestProfile
+from ..nplusone import RepeatedQueriesError, detect_repeated_queries
+
+User = get_user_model()
+
+
+class MeasureTests(TestCase):
+    def test_template_time_is_counted_in_own_thread_only(self):
+        render = Template.render
+        template = Template('{{ text }}')
+        with measure() as stats:
+            thread = threading.Thread(
+                target=template.render, args=(Context({'text': 'чужой'}),)
+            )
+            thread.start()
+            thread.join()
+            self.assertEqual(stats.template_time, 0)
+            template.render(Context({'text': 'свой'}))
+        self.assertGreater(stats.template_time, 0)
+        self.assertIs(Template.render, render)
+
+
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        Post.objects.create(text='Пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def test_metrics_record_views_and_fragments(self):
+        self.authorized_client.get(reverse('posts:index'))
+        self.authorized_client.get(reverse('posts:index'))
+        text = self.staff_client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            text
+        )
+        self.assertIn('yatube_responses_total{view="posts:index",'
+                      'status="200"} 2', text)
+        self.assertIn('yatube_sql_queries_total{view="posts:index"}', text)
+        self.assertIn('yatube_fragment_cache_total{fragment="index_page",'
+                      'result="miss"} 1', text)
+        self.assertIn('yatube_fragment_cache_total{fragment="index_page",'
+                      'result="hit"} 1', text)
+
+    def test_metrics_are_staff_only(self):
+        response = self.authorized_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn(b'yatube_', response.content)
+
+
+@override_settings(NPLUSONE_THRESHOLD=3)
+class RepeatedQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for i in range(5):
+            author = User.objects.create_user(username=f'author{i}')
+            Post.objects.create(text=f'Пост {i}', author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(NPLUSONE_RAISE=True)
+    def test_template_loop_is_reported_with_line(self):
+        template = Template(
+            '{% for post in posts %}\n{{ post.author.username }}\n'
+            '{% endfor %}'
+        )
+        with detect_repeated_queries() as detector:
+            template.render(Context({'posts': Post.objects.all()}))
+        with self.assertRaisesMessage(
+            RepeatedQueriesError,
+            'запрос выполнен 5 раз, повтор из <unknown source>, строка 2: '
+            'post.author.username',
+        ):
+            detector.check('test')
+
+    def test_select_related_is_not_reported(self):
+        with detect_repeated_queries() as detector:
+            for post in Post.objects.select_related('author'):
+                post.author.username
+        detector.check('test')
+
+    @override_settings(NPLUSONE_THRESHOLD=0, NPLUSONE_RAISE=True)
+    def test_middleware_raises_in_tests(self):
+        with self.assertRaises(RepeatedQueriesError):
+            Client().get(reverse('posts:index'))
+
+    @override_settings(NPLUSONE_THRESHOLD=0, NPLUSONE_RAISE=False)
+    def test_middleware_logs_in_production(self):
+        with self.assertLogs('yatube.nplusone', 'WARNING') as logs:
+            response = Client().get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('posts:index', logs.output[0])
+
+
+class RequestProfilingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.staff = User.objects.create_superuser('staff', 's@s.ru', 'pass')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+        self.url = reverse('posts:post_detail',
+                           kwargs={'post_id': self.post.pk})
+
+    def test_cprofile_mode_by_query_flag(self):
+        response = self.staff_client.get(self.url, {'_profile': 'cprofile'})
+        profile = RequestProfile.objects.get(
+            pk=response['X-Yatube-Profile-Id']
+        )
+        self.assertEqual(profile.view_name, 'posts:post_detail')
+        self.assertEqual(profile.mode, RequestProfile.MODE_CPROFILE)
+        self.assertEqual(profile.status, 200)
+        self.assertEqual(profile.user, self.staff)
+        self.assertGreater(profile.queries, 0)
+        self.assertIn('function calls', profile.report)
+
+    @override_settings(PROFILE_SAMPLE_INTERVAL=0.0001)
+    def test_sample_mode_by_header(self):
+        response = self.staff_client.get(self.url, HTTP_X_YATUBE_PROFILE='1')
+        profile = RequestProfile.objects.get(
+            pk=response['X-Yatube-Profile-Id']
+        )
+        self.assertEqual(profile.mode, RequestProfile.MODE_SAMPLE)
+        self.assertIn('Снимков:', profile.report)
+
+    def test_profiling_is_staff_only(self):
+        response = self.authorized_client.get(
+            self.url, {'_profile': 'cprofile'}
+        )
+        self.assertNotIn('X-Yatube-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILE_KEEP=2)
+    def test_old_profiles_are_dropped(self):
+        for _ in range(3):
+            self.staff_client.get(self.url, {'_profile': 'sample'})
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+    def test_profiles_listed_in_admin(self):
+        self.staff_client.get(self.url, {'_profile': 'sample'})
+        response = self.staff_client.get('/admin/core/requestprofile/')
+        self.assertContains(response, 'posts:post_detail')
@@ -1,10 +1,15 @@
 from django.contrib import admin
+from django.db import connection
+from django.db.models.expressions import RawSQL
 
-from .models import Group, Post, Comment
+from .forms import PostAdminForm
+from .models import Comment, Group, Post, ThumbnailJob
+from .search import MATCH_IDS_SQL, match_expression
 
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
+    form = PostAdminForm
     list_display = (
         'pk',
         'text',
@@ -18,6 +23,13 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по индексу FTS5 вместо LIKE '%q%' по всей таблице."""
+        match = match_expression(search_term)
+        if not match or connection.vendor != 'sqlite':
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=RawSQL(MATCH_IDS_SQL, (match,))), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -41,3 +53,14 @@ class CommentAdmin(admin.ModelAdmin):
         'text',
         'created',
     )
+
+
+@admin.register(ThumbnailJob)
+class ThumbnailJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'image',
+        'created',
+        'attempts',
+    )
+    list_filter = ('attempts',)
@@ -0,0 +1,62 @@
+"""Счётчики поколений для фрагментного кэша лент.
+
+Ключ фрагмента включает номера поколений данных, из которых он собран,
+поэтому изменение данных не удаляет фрагменты, а делает их ключи
+недостижимыми. Устаревшие фрагменты вытесняются из кэша сами.
+"""
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+
+GENERATION_KEY = 'generation:{}'
+
+CHANGED_KEY = 'changed:{}'
+
+PAGE_PARAMS = ('page', 'after', 'before')
+
+
+def get_generation(name):
+    key = GENERATION_KEY.format(name)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(name):
+    """Переводит поколение вперёд.
+
+    Номером становится текущее время: incr кэша на файлах не атомарен, и
+    два процесса, увеличившие счётчик одновременно, записали бы один и
+    тот же номер. Время не совпадёт и с номером, под которым ещё лежат
+    старые фрагменты, если счётчик был вытеснен из кэша.
+    """
+    cache.set_many({
+        GENERATION_KEY.format(name): time.time_ns(),
+        CHANGED_KEY.format(name): time.time(),
+    }, None)
+
+
+def last_changed(*names):
+    """Время последнего bump_generation среди names.
+
+    Неизвестное время (кэш очищен или вытеснен) считается текущим и
+    запоминается: лишний 200 лучше, чем 304 на изменившуюся страницу.
+    """
+    keys = [CHANGED_KEY.format(name) for name in names]
+    changed = cache.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in changed:
+            cache.add(key, now, None)
+            changed[key] = cache.get(key, now)
+    return datetime.fromtimestamp(max(changed.values()), timezone.utc)
+
+
+def feed_cache_version(request, *names):
+    """Версия фрагмента ленты: поколения данных и параметры страницы."""
+    parts = [str(get_generation(name)) for name in names]
+    parts.extend(request.GET.get(param, '') for param in PAGE_PARAMS)
+    return ':'.join(parts)
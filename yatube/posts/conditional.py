@@ -0,0 +1,52 @@
+"""Условные GET-запросы (ETag/Last-Modified) для страниц постов.
+
+Валидаторы собираются из поколений cache_versions, поэтому проверка
+If-None-Match не ходит в базу: на неизменившуюся страницу отвечаем 304,
+не выполняя запросов view и не рендеря шаблон.
+"""
+import hashlib
+
+from django.views.decorators.http import condition
+
+from .cache_versions import get_generation, last_changed
+
+USER_NAME = '{user}'
+
+
+def resolve_names(request, names):
+    """Подставляет id читателя в поколения вида 'follow:{user}'; для
+    гостя такие поколения пропускаются."""
+    user = request.user
+    return [
+        name.format(user=user.pk) for name in names
+        if USER_NAME not in name or user.is_authenticated
+    ]
+
+
+def page_condition(*names):
+    """Декоратор view: ETag и Last-Modified по поколениям names.
+
+    ETag включает полный путь с параметрами, id читателя, ключ сессии и
+    токен CSRF: шапка и кнопки страницы у каждого пользователя свои, а
+    формы страницы несут токен, который меняется при новом входе.
+    Last-Modified токен не отражает, поэтому вошедшим он не отдаётся.
+    """
+    def etag(request, *args, **kwargs):
+        parts = [
+            request.get_full_path(),
+            str(request.user.pk if request.user.is_authenticated else ''),
+            request.session.session_key or '',
+            request.META.get('CSRF_COOKIE', ''),
+        ]
+        parts.extend(
+            str(get_generation(name))
+            for name in resolve_names(request, names)
+        )
+        return hashlib.md5(':'.join(parts).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        return last_changed(*resolve_names(request, names))
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -0,0 +1,63 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарно через F() в обработчиках сигналов создания и
+удаления. Накопившееся расхождение исправляет recount_counters().
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def shift_counter(queryset, field, delta):
+    """Сдвигает счётчик на delta одним UPDATE, не уходя ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def shift_user_counter(user_id, field, delta):
+    shift_counter(UserStats.objects.filter(user_id=user_id), field, delta)
+
+
+def shift_group_counter(group_id, delta):
+    if group_id is not None:
+        shift_counter(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def shift_comments_counter(post_id, delta):
+    shift_counter(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def _count_of(model, field, outer='pk'):
+    """Подзапрос числа строк model, ссылающихся на внешнюю строку."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef(outer)})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+def recount_counters():
+    """Пересчитывает все счётчики по фактическим данным."""
+    UserStats.objects.bulk_create(
+        [
+            UserStats(user_id=user_id)
+            for user_id in User.objects.filter(stats__isnull=True)
+            .values_list('pk', flat=True)
+            .iterator()
+        ],
+        ignore_conflicts=True,
+    )
+    Post.objects.update(comments_count=_count_of(Comment, 'post'))
+    Group.objects.update(posts_count=_count_of(Post, 'group'))
+    UserStats.objects.update(
+        posts_count=_count_of(Post, 'author', 'user'),
+        followers_count=_count_of(Follow, 'author', 'user'),
+        following_count=_count_of(Follow, 'user', 'user'),
+    )
@@ -0,0 +1,37 @@
+"""Кэш подписок читателя: множество id авторов, на которых он подписан.
+
+Множество загружается из базы один раз и лежит в общем кэше под
+поколением 'follow:<id читателя>'. Подписка и отписка переводят
+поколение вперёд, поэтому вопросы «подписан ли я на автора» и «на кого
+я подписан» в view и ленте подписок обходятся без запросов, а все
+процессы видят новое множество сразу. Множество, собранное по базе
+одновременно с подпиской, ложится под старое поколение и не читается.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_versions import get_generation
+from .models import Follow
+
+FOLLOWING_KEY = 'following:{}:{}'
+
+
+def followed_author_ids(user_id):
+    """frozenset id авторов, на которых подписан пользователь."""
+    key = FOLLOWING_KEY.format(
+        user_id, get_generation(f'follow:{user_id}')
+    )
+    author_ids = cache.get(key)
+    if author_ids is None:
+        author_ids = frozenset(
+            Follow.objects.filter(user_id=user_id)
+            .values_list('author_id', flat=True)
+        )
+        cache.set(key, author_ids, settings.FOLLOW_GRAPH_TIMEOUT)
+    return author_ids
+
+
+def is_following(user, author_id):
+    return user.is_authenticated and author_id in followed_author_ids(
+        user.pk
+    )
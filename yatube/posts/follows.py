@@ -0,0 +1,63 @@
+"""Подписка и отписка без гонок.
+
+Подписка — вставка с игнорированием конфликта по user_author, поэтому
+двойной клик или параллельный импорт не превращаются в IntegrityError.
+Такая вставка не посылает сигналов Follow: лента и счётчики
+обновляются здесь и только для строк, которые она действительно
+добавила. Отписка — обычный delete() по заранее заблокированным
+строкам, её побочные эффекты выполняют сигналы post_delete, по одному
+разу на удалённую строку.
+"""
+from django.db import connection, transaction
+
+from .cache_versions import bump_generation
+from .counters import shift_counter, shift_user_counter
+from .models import Follow, UserStats
+from .page_cache import purge_profiles
+from .timeline import backfill_timeline, followers_changed
+
+INSERT_FOLLOW_SQL = """
+    INSERT INTO {follow} (user_id, author_id) VALUES (%s, %s)
+    ON CONFLICT DO NOTHING
+"""
+
+
+def follow_authors(user_id, author_ids):
+    author_ids = set(author_ids) - {user_id}
+    if not author_ids:
+        return
+    sql = INSERT_FOLLOW_SQL.format(follow=Follow._meta.db_table)
+    added = []
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for author_id in sorted(author_ids):
+                cursor.execute(sql, [user_id, author_id])
+                if cursor.rowcount:
+                    added.append(author_id)
+        if not added:
+            return
+        for author_id in added:
+            backfill_timeline(user_id, author_id)
+        shift_counter(
+            UserStats.objects.filter(user_id__in=added), 'followers_count', 1
+        )
+        shift_user_counter(user_id, 'following_count', len(added))
+        followers_changed(added, 1)
+    bump_generation(f'follow:{user_id}')
+    bump_generation('follows')
+    purge_profiles(user_id, *added)
+
+
+def unfollow_authors(user_id, author_ids):
+    author_ids = set(author_ids)
+    if not author_ids:
+        return
+    with transaction.atomic():
+        # Параллельная отписка ждёт блокировки и уже не видит строк,
+        # поэтому сигналы не сдвигают счётчики дважды.
+        follow_ids = list(
+            Follow.objects.select_for_update()
+            .filter(user_id=user_id, author_id__in=author_ids)
+            .values_list('pk', flat=True)
+        )
+        Follow.objects.filter(pk__in=follow_ids).delete()
@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import normalize_image
 from .models import Comment, Group, Post
 
 
@@ -10,6 +12,26 @@ class PostForm(forms.ModelForm):
         help_texts = {'text': 'Текст нового поста',
                       'group': 'Группа, к которой будет относиться пост'}
 
+    def clean_image(self):
+        """Уменьшает и перекодирует новую картинку, запоминая размеры
+        файла до и после."""
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            image, original_size, stored_size = normalize_image(image)
+            self.instance.image_original_size = original_size
+            self.instance.image_stored_size = stored_size
+        elif not image:
+            self.instance.image_original_size = None
+            self.instance.image_stored_size = None
+        return image
+
+
+class PostAdminForm(PostForm):
+    """Форма админки: все поля поста, картинка нормализуется так же,
+    как на сайте."""
+    class Meta(PostForm.Meta):
+        fields = '__all__'
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
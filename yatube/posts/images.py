@@ -0,0 +1,69 @@
+"""Нормализация картинок постов при загрузке.
+
+Оригиналы с камер весят десятки мегабайт, и их декодирует каждый, кто
+строит миниатюры или отдаёт файл напрямую. Поэтому при загрузке
+картинка уменьшается до POST_IMAGE_MAX_SIZE, теряет EXIF и
+перекодируется в POST_IMAGE_FORMAT с качеством POST_IMAGE_QUALITY.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+
+def target_format(image):
+    """Формат хранения; JPEG не умеет прозрачность, такие картинки
+    сохраняются в PNG."""
+    image_format = settings.POST_IMAGE_FORMAT
+    has_alpha = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+    if image_format == 'JPEG' and has_alpha:
+        return 'PNG'
+    return image_format
+
+
+def normalize_image(file_):
+    """Возвращает (файл для сохранения, исходный размер, новый размер).
+
+    Если картинку не нужно уменьшать, в ней нет метаданных и
+    перекодирование её не сжимает, возвращается исходный файл.
+    Анимированные картинки не трогаются: перекодирование оставило бы
+    только первый кадр.
+    """
+    original_size = file_.size
+    file_.seek(0)
+    image = Image.open(file_)
+    if getattr(image, 'is_animated', False):
+        file_.seek(0)
+        return file_, original_size, original_size
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    needs_resize = image.width > max_size[0] or image.height > max_size[1]
+    has_metadata = bool(image.info.get('exif') or image.getexif())
+    # Для JPEG draft() декодирует сразу в уменьшенном масштабе, не
+    # разворачивая в памяти полный кадр с камеры.
+    image.draft('RGB', max_size)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(max_size, Image.LANCZOS)
+    image_format = target_format(image)
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    output = BytesIO()
+    image.save(
+        output,
+        image_format,
+        quality=settings.POST_IMAGE_QUALITY,
+        optimize=True,
+    )
+    stored_size = output.tell()
+    if not needs_resize and not has_metadata and stored_size >= original_size:
+        file_.seek(0)
+        return file_, original_size, original_size
+    root, _ = os.path.splitext(os.path.basename(file_.name))
+    name = f'{root}.{EXTENSIONS.get(image_format, image_format.lower())}'
+    normalized = ContentFile(output.getvalue(), name=name)
+    return normalized, original_size, stored_size
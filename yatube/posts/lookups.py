@@ -0,0 +1,75 @@
+"""Кэш групп и авторов для адресов со slug и username.
+
+Группы и пользователи меняются редко, а ищутся на каждом запросе к
+group_posts и profile. Найденный объект и отметка «не найдено» лежат
+в кэше; сигналы сбрасывают запись при сохранении и удалении.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+
+from .models import Group, User
+
+GROUP_KEY = 'lookup:group:{}'
+AUTHOR_KEY = 'lookup:author:{}'
+
+# Отметка в кэше для адреса, по которому ничего нет: поток 404 от
+# краулеров не доходит до базы.
+MISSING = 'missing'
+
+# Поля, нужные страницам автора; хэш пароля в кэш не попадает.
+AUTHOR_FIELDS = ('id', 'username', 'first_name', 'last_name')
+
+# Поля группы, которые меняются только её сохранением. Счётчик постов
+# в кэш не попадает: он отложен и читается из базы при обращении.
+GROUP_FIELDS = ('id', 'slug', 'title', 'description')
+
+
+def lookup_key(template, value):
+    # slug и username могут содержать кириллицу, недопустимую в ключах
+    # memcached.
+    return template.format(hashlib.md5(value.encode()).hexdigest())
+
+
+def cached_lookup(key, queryset, **lookup):
+    obj = cache.get(key)
+    if obj is None:
+        obj = queryset.filter(**lookup).first()
+        if obj is None:
+            cache.set(key, MISSING, settings.LOOKUP_MISSING_TIMEOUT)
+        else:
+            cache.set(key, obj, settings.LOOKUP_CACHE_TIMEOUT)
+    if obj is None or obj == MISSING:
+        raise Http404
+    return obj
+
+
+def get_group_or_404(slug):
+    return cached_lookup(
+        lookup_key(GROUP_KEY, slug),
+        Group.objects.only(*GROUP_FIELDS),
+        slug=slug,
+    )
+
+
+def get_author_or_404(username):
+    return cached_lookup(
+        lookup_key(AUTHOR_KEY, username),
+        User.objects.only(*AUTHOR_FIELDS),
+        username=username,
+    )
+
+
+def forget_group(*slugs):
+    cache.delete_many(
+        [lookup_key(GROUP_KEY, slug) for slug in slugs if slug]
+    )
+
+
+def forget_author(*usernames):
+    cache.delete_many(
+        [lookup_key(AUTHOR_KEY, username)
+         for username in usernames if username]
+    )
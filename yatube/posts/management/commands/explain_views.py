@@ -0,0 +1,151 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from posts import urls as posts_urls
+from posts.models import Comment, Follow, Post
+
+FEED_MODELS = (Post, Comment, Follow)
+
+# View, которые пишут в базу: GET на них не показывает планы чтения лент.
+WRITE_VIEWS = ('add_comment', 'follow_bulk', 'profile_follow',
+               'profile_unfollow')
+
+DUMMY_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Снимает EXPLAIN QUERY PLAN запросов каждого view из posts/urls.py '
+        'с индексами лент и без них'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json',
+            dest='json_path',
+            help='Сохранить отчёт в JSON-файл',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN есть только в SQLite')
+        post = (
+            Post.objects.select_related('author', 'group')
+            .order_by('group__isnull', '-pk')
+            .first()
+        )
+        if post is None:
+            raise CommandError('В базе нет постов')
+        follow = Follow.objects.select_related('user').first()
+        reader = follow.user if follow else post.author
+        url_kwargs = {
+            'post_id': post.pk,
+            'username': post.author.username,
+            'slug': post.group.slug if post.group else None,
+        }
+        with override_settings(CACHES=DUMMY_CACHES, DEBUG=False):
+            after = self.capture_plans(reader, url_kwargs)
+            before = self.capture_plans(reader, url_kwargs, drop=True)
+
+        old_queries_by_view = {name: queries for name, _, queries in before}
+        report = []
+        for name, url, queries in after:
+            old_queries = old_queries_by_view.get(name, [])
+            view = {'view': name, 'url': url}
+            if len(old_queries) != len(queries):
+                # Планы разных запросов сравнивать бессмысленно: без
+                # индексов view выполнил другой набор запросов.
+                view['mismatch'] = (
+                    f'с индексами {len(queries)} запросов, '
+                    f'без индексов {len(old_queries)}'
+                )
+                view['queries'] = [
+                    {'sql': sql, 'before': None, 'after': plan}
+                    for sql, plan in queries
+                ]
+            else:
+                view['queries'] = [
+                    {'sql': sql, 'before': old_plan, 'after': plan}
+                    for (sql, plan), (_, old_plan)
+                    in zip(queries, old_queries)
+                ]
+            report.append(view)
+        self.print_report(report)
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def capture_plans(self, reader, url_kwargs, drop=False):
+        """Обходит view внутри транзакции, которая затем откатывается."""
+        results = []
+        with transaction.atomic():
+            if drop:
+                self.drop_feed_indexes()
+            client = Client()
+            client.force_login(reader)
+            for pattern in posts_urls.urlpatterns:
+                if pattern.name in WRITE_VIEWS:
+                    continue
+                names = pattern.pattern.converters.keys()
+                if any(url_kwargs.get(name) is None for name in names):
+                    continue
+                url = reverse(
+                    f'{posts_urls.app_name}:{pattern.name}',
+                    kwargs={name: url_kwargs[name] for name in names},
+                )
+                with CaptureQueriesContext(connection) as queries:
+                    client.get(url)
+                results.append((
+                    pattern.name,
+                    url,
+                    [
+                        (query['sql'], self.explain(query['sql'], drop))
+                        for query in queries.captured_queries
+                        if query['sql'].lstrip().upper().startswith('SELECT')
+                    ],
+                ))
+            transaction.set_rollback(True)
+        return results
+
+    def drop_feed_indexes(self):
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for model in FEED_MODELS:
+                for index in model._meta.indexes:
+                    cursor.execute(
+                        f'DROP INDEX IF EXISTS {quote(index.name)}'
+                    )
+
+    def explain(self, sql, drop):
+        # Метка делает текст запроса уникальным: иначе sqlite3 берёт из
+        # кэша выражений план, подготовленный ещё с индексами.
+        mark = 'without indexes' if drop else 'with indexes'
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql} /* {mark} */')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def print_report(self, report):
+        for view in report:
+            self.stdout.write(
+                self.style.MIGRATE_HEADING(f"{view['view']} {view['url']}")
+            )
+            if 'mismatch' in view:
+                self.stdout.write(self.style.WARNING(
+                    f"  Планы не сопоставлены: {view['mismatch']}"
+                ))
+            for query in view['queries']:
+                self.stdout.write(f"  {query['sql'][:120]}")
+                if query['before'] is not None:
+                    self.stdout.write(
+                        f"    до:    {'; '.join(query['before'])}"
+                    )
+                self.stdout.write(f"    после: {'; '.join(query['after'])}")
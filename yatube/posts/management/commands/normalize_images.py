@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand
+
+from posts.cache_versions import bump_generation
+from posts.images import normalize_image
+from posts.models import Post
+from posts.page_cache import purge_posts
+from posts.thumbnails import queue_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Уменьшает и перекодирует картинки постов, загруженные до '
+        'нормализации при загрузке'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, ничего не сохраняя')
+
+    def handle(self, *args, **options):
+        processed = saved = 0
+        last_pk = 0
+        while True:
+            # Пачки по первичному ключу: в памяти не больше batch_size
+            # строк, и уже обработанные картинки не выбираются повторно.
+            batch = list(
+                Post.objects.filter(
+                    pk__gt=last_pk, image_stored_size__isnull=True
+                ).exclude(image='')
+                .order_by('pk')
+                .values_list('pk', 'image')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            for _, name in batch:
+                processed += 1
+                saved += self.normalize(name, options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {processed}, '
+            f'освобождено байт: {saved}'
+        ))
+
+    def normalize(self, name, dry_run):
+        """Нормализует файл и переводит на него все посты со старым
+        именем; возвращает число сэкономленных байт."""
+        storage = Post.image.field.storage
+        if not storage.exists(name):
+            self.stderr.write(f'Нет файла {name}')
+            return 0
+        with storage.open(name) as file_:
+            try:
+                result, original_size, stored_size = normalize_image(file_)
+            except OSError:
+                self.stderr.write(f'Не картинка: {name}')
+                return 0
+            if dry_run:
+                return original_size - stored_size
+            new_name = name
+            if result is not file_:
+                new_name = storage.save(
+                    Post.image.field.generate_filename(None, result.name),
+                    result,
+                )
+        updated = Post.objects.filter(image=name).update(
+            image=new_name,
+            image_original_size=original_size,
+            image_stored_size=stored_size,
+        )
+        if new_name != name:
+            # save() учёл одну ссылку на новый файл, остальные посты со
+            # старой картинкой переходят на него же.
+            storage.add_reference(new_name, stored_size, updated - 1)
+            storage.release(name, updated)
+            queue_thumbnails(new_name)
+            # update() не шлёт сигналов: фрагменты и страницы со старой,
+            # уже удалённой картинкой сбрасываются здесь.
+            bump_generation('posts')
+            purge_posts(Post.objects.filter(image=new_name))
+        return original_size - stored_size
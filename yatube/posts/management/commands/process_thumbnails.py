@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import process_thumbnail_jobs, queue_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры картинок постов из очереди пулом потоков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Размер пула (по умолчанию '
+                                 'THUMBNAIL_WORKERS)')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--backfill', action='store_true',
+                            help='Поставить в очередь картинки всех постов')
+        parser.add_argument('--forever', action='store_true',
+                            help='Не выходить, когда очередь опустела')
+        parser.add_argument('--sleep', type=float, default=5.0,
+                            help='Пауза между опросами пустой очереди')
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            images = (
+                Post.objects.exclude(image='')
+                .values_list('image', flat=True)
+                .iterator()
+            )
+            batch = []
+            for image in images:
+                batch.append(image)
+                if len(batch) >= options['batch_size']:
+                    queue_thumbnails(*batch)
+                    batch = []
+            queue_thumbnails(*batch)
+        total = 0
+        while True:
+            processed = process_thumbnail_jobs(
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+            )
+            total += processed
+            if processed:
+                continue
+            if not options['forever']:
+                break
+            time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f'Обработано задач: {total}'))
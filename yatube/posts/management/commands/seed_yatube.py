@@ -0,0 +1,309 @@
+"""Наполнение базы синтетическими данными для нагрузочных проверок.
+
+Строки создаются генераторами и пишутся через bulk_create пачками по
+--batch-size, так что в памяти одновременно лежит одна пачка и массивы
+id. Все случайные решения берутся из random.Random(--seed), а даты
+отсчитываются назад от --now, а не от текущего времени: один и тот же
+seed даёт те же тексты, даты, авторов, группы и подписки.
+
+bulk_create не вызывает сигналы, поэтому счётчики, ленты подписок и
+кэш приводятся в порядок отдельными шагами в конце.
+"""
+import random
+import time
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from PIL import Image, ImageDraw
+
+from posts.counters import recount_counters
+from posts.models import Comment, Follow, Group, Post, User
+from posts.thumbnails import queue_thumbnails
+from posts.timeline import fill_timelines
+
+WORDS = (
+    'утро', 'город', 'дорога', 'кофе', 'книга', 'море', 'ветер', 'поезд',
+    'друг', 'работа', 'вечер', 'солнце', 'дождь', 'письмо', 'лес', 'река',
+    'музыка', 'кино', 'сад', 'окно', 'снег', 'горы', 'выходные', 'идея',
+    'сегодня', 'снова', 'наконец', 'долго', 'быстро', 'тихо', 'вместе',
+    'новый', 'старый', 'тёплый', 'холодный', 'первый', 'последний',
+    'читал', 'видел', 'думал', 'писал', 'ехал', 'ждал', 'нашёл', 'понял',
+)
+COLORS = (
+    '#d35400', '#2980b9', '#27ae60', '#8e44ad', '#c0392b', '#16a085',
+    '#f39c12', '#2c3e50',
+)
+SECONDS_PER_DAY = 24 * 60 * 60
+# Момент, от которого по умолчанию раскладываются даты.
+SEED_NOW = '2024-01-01T00:00:00+00:00'
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def skewed_choice(rng, items, skew):
+    """Элемент с перекосом к началу последовательности: при skew=3
+    первый процент элементов получает около пятой части выборов."""
+    return items[int(len(items) * rng.random() ** skew)]
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Временно отключает auto_now_add, чтобы bulk_create сохранил даты,
+    разложенные по прошлому, а не текущее время."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу пользователями, группами, постами, комментариями '
+        'и подписками для нагрузочных проверок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument('--follows', type=int, default=20000,
+                            help='Сколько подписок попытаться создать; '
+                                 'повторы пар отбрасываются')
+        parser.add_argument('--images', type=int, default=0,
+                            help='Сколько разных картинок создать')
+        parser.add_argument('--image-share', type=float, default=0.2,
+                            help='Доля постов с картинкой')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней разложить даты')
+        parser.add_argument('--skew', type=float, default=3.0,
+                            help='Перекос к плодовитым авторам и '
+                                 'популярным постам; 1 — равномерно')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--now', default=SEED_NOW,
+                            help='Самая поздняя дата постов и комментариев, '
+                                 'ISO 8601')
+        parser.add_argument('--prefix', default='seed',
+                            help='Префикс имён пользователей и слагов')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--no-timelines', action='store_true',
+                            help='Не собирать ленты подписок: на больших '
+                                 'объёмах это самый долгий шаг')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 and options['follows']:
+            raise CommandError('Для подписок нужно хотя бы два пользователя')
+        if options['posts'] and not options['users']:
+            raise CommandError('Постам нужны авторы: укажите --users')
+        prefix = options['prefix']
+        if User.objects.filter(username=f'{prefix}_0').exists():
+            raise CommandError(
+                f'Данные с префиксом {prefix} уже есть, укажите --prefix'
+            )
+        try:
+            now = parse_datetime(options['now'])
+        except ValueError:
+            now = None
+        if now is None:
+            raise CommandError('--now: нужна дата и время в ISO 8601')
+        if timezone.is_naive(now):
+            now = timezone.make_aware(now)
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.skew = options['skew']
+        self.now = now
+        self.period = options['days'] * SECONDS_PER_DAY
+
+        user_ids = self.step('Пользователи', self.create_users,
+                             prefix, options['users'])
+        group_ids = self.step('Группы', self.create_groups,
+                              prefix, options['groups'])
+        images = self.step('Картинки', self.create_images,
+                           options['images'])
+        post_ids = self.step('Посты', self.create_posts, options['posts'],
+                             user_ids, group_ids, images,
+                             options['image_share'])
+        self.step('Комментарии', self.create_comments,
+                  options['comments'], user_ids, post_ids)
+        self.step('Подписки', self.create_follows,
+                  options['follows'], user_ids)
+        self.step('Счётчики', recount_counters)
+        if not options['no_timelines']:
+            self.step('Ленты подписок', self.fill_timelines, user_ids)
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS('База наполнена'))
+
+    def step(self, title, func, *args):
+        started = time.monotonic()
+        result = func(*args)
+        elapsed = time.monotonic() - started
+        size = f': {len(result)}' if result is not None else ''
+        self.stdout.write(f'{title}{size} за {elapsed:.1f} с')
+        return result
+
+    def insert(self, model, objects):
+        """Пишет объекты пачками; возвращает id новых строк по порядку.
+
+        bulk_create на SQLite не проставляет pk, поэтому id выбираются
+        после вставки как всё, что больше прежнего максимума.
+        """
+        last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        for batch in batched(objects, self.batch_size):
+            # Размер запроса INSERT Django подбирает сам по лимитам базы.
+            model.objects.bulk_create(batch)
+        return array('q', model.objects.filter(pk__gt=last_pk)
+                     .order_by('pk').values_list('pk', flat=True)
+                     .iterator())
+
+    def past_date(self):
+        return self.now - timedelta(seconds=self.rng.randrange(self.period))
+
+    def words(self, low, high):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def create_users(self, prefix, count):
+        # Хэш пароля считается один раз: PBKDF2 на каждого пользователя
+        # занял бы больше времени, чем вся остальная вставка.
+        password = make_password(None)
+        return self.insert(User, (
+            User(username=f'{prefix}_{number}', password=password,
+                 first_name=self.rng.choice(WORDS).capitalize())
+            for number in range(count)
+        ))
+
+    def create_groups(self, prefix, count):
+        return self.insert(Group, (
+            Group(title=f'Группа {number}', slug=f'{prefix}-{number}',
+                  description=self.words(5, 20))
+            for number in range(count)
+        ))
+
+    def create_images(self, count):
+        """Сохраняет count разных картинок; возвращает пары (имя, размер)."""
+        storage = Post.image.field.storage
+        images = []
+        for number in range(count):
+            image = Image.new('RGB', (640, 480), self.rng.choice(COLORS))
+            draw = ImageDraw.Draw(image)
+            for _ in range(8):
+                left = self.rng.randrange(600)
+                top = self.rng.randrange(440)
+                draw.rectangle(
+                    (left, top, left + self.rng.randint(20, 200),
+                     top + self.rng.randint(20, 200)),
+                    fill=self.rng.choice(COLORS),
+                )
+            output = BytesIO()
+            image.save(output, 'JPEG', quality=85)
+            name = storage.save(
+                Post.image.field.generate_filename(None, f'seed{number}.jpg'),
+                ContentFile(output.getvalue()),
+            )
+            images.append((name, output.tell()))
+        return images
+
+    def create_posts(self, count, user_ids, group_ids, images, image_share):
+        used = Counter()
+
+        def posts():
+            for number in range(count):
+                post = Post(
+                    # Номер в тексте соблюдает unique_together с автором.
+                    text=f'{self.words(5, 60)} #{number}',
+                    author_id=skewed_choice(self.rng, user_ids, self.skew),
+                    pub_date=self.past_date(),
+                )
+                if group_ids and self.rng.random() < 0.5:
+                    post.group_id = self.rng.choice(group_ids)
+                if images and self.rng.random() < image_share:
+                    name, size = self.rng.choice(images)
+                    post.image = name
+                    post.image_original_size = post.image_stored_size = size
+                    used[name] += 1
+                yield post
+
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            post_ids = self.insert(Post, posts())
+        self.settle_references(images, used)
+        return post_ids
+
+    def settle_references(self, images, used):
+        """Сводит счётчик ссылок StoredFile с числом постов на файл:
+        save() учёл по одной ссылке на каждое сохранение."""
+        storage = Post.image.field.storage
+        saved = Counter(name for name, _ in images)
+        for name, size in dict(images).items():
+            extra = used[name] - saved[name]
+            if extra > 0:
+                storage.add_reference(name, size, extra)
+            elif extra < 0:
+                storage.release(name, -extra)
+        queue_thumbnails(*used)
+
+    def create_comments(self, count, user_ids, post_ids):
+        if not post_ids:
+            return None
+        comments = (
+            Comment(
+                post_id=skewed_choice(self.rng, post_ids, self.skew),
+                author_id=self.rng.choice(user_ids),
+                text=self.words(3, 30),
+                created=self.past_date(),
+            )
+            for _ in range(count)
+        )
+        with explicit_dates(Comment._meta.get_field('created')):
+            return self.insert(Comment, comments)
+
+    def create_follows(self, count, user_ids):
+        if not count:
+            return None
+
+        def pairs():
+            for _ in range(count):
+                user_id = self.rng.choice(user_ids)
+                author_id = skewed_choice(self.rng, user_ids, self.skew)
+                if user_id != author_id:
+                    yield user_id, author_id
+
+        last_pk = Follow.objects.aggregate(last=Max('pk'))['last'] or 0
+        for batch in batched(pairs(), self.batch_size):
+            # Повторы внутри пачки убирает dict, между пачками —
+            # ограничение user_author.
+            Follow.objects.bulk_create(
+                [Follow(user_id=user_id, author_id=author_id)
+                 for user_id, author_id in dict.fromkeys(batch)],
+                ignore_conflicts=True,
+            )
+        return array('q', Follow.objects.filter(pk__gt=last_pk)
+                     .values_list('pk', flat=True).iterator())
+
+    def fill_timelines(self, user_ids):
+        if not user_ids:
+            return None
+        step = self.batch_size
+        for start in range(0, len(user_ids), step):
+            chunk = user_ids[start:start + step]
+            fill_timelines(chunk[0], chunk[-1])
+        return None
@@ -0,0 +1,95 @@
+from django.db import migrations
+
+FORWARD_SQL = [
+    """
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        text, username, group_title,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO posts_post_fts(posts_post_fts, rank)
+    VALUES ('rank', 'bm25(10.0, 2.0, 1.0)')
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, text, username, group_title)
+        VALUES (
+            new.id,
+            new.text,
+            (SELECT username FROM auth_user WHERE id = new.author_id),
+            (SELECT title FROM posts_group WHERE id = new.group_id)
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update
+    AFTER UPDATE OF text, author_id, group_id ON posts_post BEGIN
+        UPDATE posts_post_fts SET
+            text = new.text,
+            username = (SELECT username FROM auth_user
+                        WHERE id = new.author_id),
+            group_title = (SELECT title FROM posts_group
+                           WHERE id = new.group_id)
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_username
+    AFTER UPDATE OF username ON auth_user BEGIN
+        UPDATE posts_post_fts SET username = new.username
+        WHERE rowid IN (SELECT id FROM posts_post WHERE author_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_group_title
+    AFTER UPDATE OF title ON posts_group BEGIN
+        UPDATE posts_post_fts SET group_title = new.title
+        WHERE rowid IN (SELECT id FROM posts_post WHERE group_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO posts_post_fts(rowid, text, username, group_title)
+    SELECT posts_post.id, posts_post.text, auth_user.username,
+           posts_group.title
+    FROM posts_post
+    INNER JOIN auth_user ON auth_user.id = posts_post.author_id
+    LEFT OUTER JOIN posts_group ON posts_group.id = posts_post.group_id
+    """,
+]
+
+REVERSE_SQL = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_group_title',
+    'DROP TRIGGER IF EXISTS posts_post_fts_username',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TABLE IF EXISTS posts_post_fts',
+]
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0009_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(FORWARD_SQL),
+                             run_sqlite(REVERSE_SQL)),
+    ]
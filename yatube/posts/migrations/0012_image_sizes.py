@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:06
+
+from django.db import migrations, models
+
+from posts.search_triggers import (DROP_TRIGGERS_SQL, TRIGGERS_SQL,
+                                   run_sqlite)
+
+# SQLite пересоздаёт posts_post при добавлении колонки: триггеры FTS5 на
+# самой таблице пропали бы, а триггеры на auth_user и posts_group не дают
+# её переименовать. Поэтому они снимаются на время изменения схемы.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_thumbnail_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_sqlite(DROP_TRIGGERS_SQL),
+            run_sqlite(TRIGGERS_SQL),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_original_size',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Размер загруженной картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_stored_size',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Размер сохранённой картинки'),
+        ),
+        migrations.RunPython(
+            run_sqlite(TRIGGERS_SQL),
+            run_sqlite(DROP_TRIGGERS_SQL),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:08
+
+from django.db import migrations, models
+from django.db.models import Count
+
+import posts.storage
+from posts.search_triggers import (DROP_TRIGGERS_SQL, TRIGGERS_SQL,
+                                   run_sqlite)
+
+
+def fill_stored_files(apps, schema_editor):
+    """Заводит учёт ссылок для картинок, загруженных раньше."""
+    Post = apps.get_model('posts', 'Post')
+    StoredFile = apps.get_model('posts', 'StoredFile')
+    storage = Post._meta.get_field('image').storage
+    images = (
+        Post.objects.exclude(image='').values('image')
+        .annotate(references=Count('pk')).order_by()
+    )
+    stored = []
+    for row in images.iterator():
+        try:
+            size = storage.size(row['image'])
+        except OSError:
+            size = 0
+        stored.append(StoredFile(name=row['image'], size=size,
+                                 references=row['references']))
+    StoredFile.objects.bulk_create(stored, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_image_sizes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('size', models.PositiveIntegerField(verbose_name='Размер')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.RunPython(
+            run_sqlite(DROP_TRIGGERS_SQL),
+            run_sqlite(TRIGGERS_SQL),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(
+            run_sqlite(TRIGGERS_SQL),
+            run_sqlite(DROP_TRIGGERS_SQL),
+        ),
+        migrations.RunPython(fill_stored_files, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,28 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
+FEED_FIELDS = (
+    'text',
+    'pub_date',
+    'image',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group__slug',
+    'comments_count',
+)
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для карточек ленты: автор и группа одним запросом,
+        только те колонки, что выводятся в шаблонах."""
+        return self.select_related('author', 'group').only(*FEED_FIELDS)
+
 
 class Post(models.Model):
     text = models.TextField(
@@ -31,24 +51,61 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    image_original_size = models.PositiveIntegerField(
+        'Размер загруженной картинки',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    image_stored_size = models.PositiveIntegerField(
+        'Размер сохранённой картинки',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = 'Посты'
         verbose_name = 'Пост'
         ordering = ['-pub_date']
         unique_together = ('text', 'author')
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Хранилище картинок записывает ссылку на файл при сохранении
+        # поля: она должна откатиться, если пост не сохранится. Без
+        # точки сохранения, как Model.save_base для моделей-наследников.
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name='Название группы')
     slug = models.SlugField(unique=True, verbose_name='Слаг')
     description = models.TextField(blank=True, null=True,
                                    verbose_name='Описание')
+    posts_count = models.PositiveIntegerField(default=0, editable=False,
+                                              verbose_name='Постов')
 
     class Meta:
         verbose_name_plural = 'Группы'
@@ -79,6 +136,10 @@ class Comment(models.Model):
         verbose_name_plural = 'Комментарии'
         verbose_name = 'Комментарий'
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['post', '-created'],
+                         name='comment_post_created'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -102,3 +163,98 @@ class Follow(models.Model):
                 fields=['user', 'author'],
                 name='user_author')
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user'),
+        ]
+
+
+class Timeline(models.Model):
+    """Материализованная лента подписок: запись на пару читатель-пост."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name_plural = 'Ленты подписок'
+        verbose_name = 'Запись ленты'
+        ordering = ['-pub_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='timeline_user_post')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date'),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author'),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые дорого считать агрегатами."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name_plural = 'Счётчики пользователей'
+        verbose_name = 'Счётчики пользователя'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class ThumbnailJob(models.Model):
+    """Очередь генерации миниатюр для загруженных картинок."""
+    image = models.CharField('Картинка', max_length=255, unique=True)
+    created = models.DateTimeField('Поставлена', auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField('Неудачных попыток',
+                                                default=0)
+
+    class Meta:
+        verbose_name_plural = 'Очередь миниатюр'
+        verbose_name = 'Миниатюра в очереди'
+        ordering = ['created']
+
+    def __str__(self):
+        return self.image
+
+
+class StoredFile(models.Model):
+    """Файл хранилища ContentAddressedStorage и число ссылок на него."""
+    name = models.CharField('Файл', max_length=255, unique=True)
+    size = models.PositiveIntegerField('Размер')
+    references = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name_plural = 'Файлы картинок'
+        verbose_name = 'Файл картинки'
+
+    def __str__(self):
+        return self.name
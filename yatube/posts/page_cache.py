@@ -0,0 +1,91 @@
+"""Кэш целых страниц для гостей.
+
+Ответ view кэшируется по пути с параметрами в пределах «области»:
+главной, группы, профиля или поста. У каждой области своё поколение
+(cache_versions), поэтому новый пост сбрасывает только главную, свою
+группу и профиль автора, а комментарий — только страницу поста.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_versions import bump_generation, get_generation
+from .models import User
+
+PAGE_KEY = 'page:{scope}:{generation}:{path}'
+
+# Поколение, общее для всех страниц: изменение группы может быть видно
+# на любой из них. Готовые миниатюры сбрасывают только страницы своих
+# постов (purge_posts).
+ALL_PAGES = 'pages'
+SHARED_GENERATIONS = (ALL_PAGES,)
+
+
+def page_generation(scope):
+    return f'page:{scope}'
+
+
+def purge_pages(*scopes):
+    """Сбрасывает кэш страниц областей вида 'group:<slug>'."""
+    for scope in scopes:
+        if scope is not None:
+            bump_generation(page_generation(scope))
+
+
+def purge_profiles(*user_ids):
+    """Сбрасывает кэш профилей пользователей по их id."""
+    purge_pages(*(
+        f'profile:{username}' for username in User.objects.filter(
+            pk__in=user_ids
+        ).values_list('username', flat=True)
+    ))
+
+
+def purge_posts(posts):
+    """Сбрасывает кэш страниц, на которых видны посты из queryset posts:
+    главной, профилей авторов, групп и страниц самих постов."""
+    scopes = {'index'}
+    for pk, username, slug in posts.values_list(
+            'pk', 'author__username', 'group__slug').order_by():
+        scopes.update((f'post:{pk}', f'profile:{username}'))
+        if slug is not None:
+            scopes.add(f'group:{slug}')
+    purge_pages(*scopes)
+
+
+def cache_anonymous_page(scope):
+    """Декоратор view: кэширует ответы гостям на PAGE_CACHE_TIMEOUT.
+
+    scope — шаблон области, заполняемый аргументами view, например
+    'profile:{username}'. Авторизованные пользователи получают страницу
+    мимо кэша: в ней их шапка, формы и кнопки подписки.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            page_scope = scope.format(**kwargs)
+            generation = '.'.join(
+                str(get_generation(name)) for name in
+                (*SHARED_GENERATIONS, page_generation(page_scope))
+            )
+            key = PAGE_KEY.format(
+                scope=page_scope,
+                generation=generation,
+                path=hashlib.md5(
+                    request.get_full_path().encode()
+                ).hexdigest(),
+            )
+            response = cache.get(key)
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.cookies:
+                cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
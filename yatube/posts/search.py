@@ -0,0 +1,84 @@
+"""Полнотекстовый поиск по постам на FTS5.
+
+Таблица posts_post_fts (миграция 0010_post_search) хранит текст поста,
+имя автора и название группы и поддерживается триггерами SQLite, поэтому
+остаётся согласованной и при bulk_create/update в обход сигналов.
+"""
+import re
+
+from django.core.paginator import Page, Paginator
+from django.db import connection
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .utils import CURSOR_SEPARATOR
+
+SEARCH_SQL = (
+    'SELECT rowid, rank FROM posts_post_fts '
+    'WHERE posts_post_fts MATCH %s {after} '
+    'ORDER BY rank, rowid LIMIT %s'
+)
+AFTER_SQL = 'AND (rank > %s OR (rank = %s AND rowid > %s))'
+MATCH_IDS_SQL = (
+    'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s'
+)
+
+
+def match_expression(query):
+    """Превращает пользовательский ввод в безопасное выражение MATCH:
+    каждое слово ищется как префикс, слова объединяются через AND."""
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def encode_rank_cursor(rank, pk):
+    raw = f'{rank!r}{CURSOR_SEPARATOR}{pk}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_rank_cursor(token):
+    if not token:
+        return None
+    try:
+        raw = urlsafe_base64_decode(token).decode()
+        rank, pk = raw.rsplit(CURSOR_SEPARATOR, 1)
+        return float(rank), int(pk)
+    except ValueError:
+        return None
+
+
+class SearchPaginator(Paginator):
+    """Курсорная выдача поиска, упорядоченная по релевантности (bm25)."""
+    is_cursor = True
+
+    def get_cursor_page(self, match, after=None):
+        params = [match]
+        after_sql = ''
+        key = decode_rank_cursor(after)
+        if key is not None:
+            after_sql = AFTER_SQL
+            params.extend([key[0], key[0], key[1]])
+        params.append(self.per_page + 1)
+        with connection.cursor() as cursor:
+            cursor.execute(SEARCH_SQL.format(after=after_sql), params)
+            hits = cursor.fetchall()
+        has_next = len(hits) > self.per_page
+        hits = hits[:self.per_page]
+        posts = self.object_list.in_bulk([pk for pk, rank in hits])
+        page = Page([posts[pk] for pk, rank in hits if pk in posts], 1, self)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if has_next:
+            last_pk, last_rank = hits[-1]
+            page.next_cursor = encode_rank_cursor(last_rank, last_pk)
+        return page
+
+
+def search_posts(post_list, query, after=None, post_per_page=10):
+    match = match_expression(query)
+    paginator = SearchPaginator(post_list, post_per_page)
+    if not match:
+        page = Page([], 1, paginator)
+        page.next_cursor = page.previous_cursor = None
+        return page
+    return paginator.get_cursor_page(match, after)
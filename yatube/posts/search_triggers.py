@@ -0,0 +1,69 @@
+"""SQL триггеров FTS5, которые держат posts_post_fts в согласии с постами.
+
+Миграции, пересоздающие posts_post в SQLite, снимают триггеры перед
+изменением схемы и ставят обратно после него. Модуль не импортирует
+модели, поэтому его можно брать в миграции.
+"""
+
+TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, text, username, group_title)
+        VALUES (
+            new.id,
+            new.text,
+            (SELECT username FROM auth_user WHERE id = new.author_id),
+            (SELECT title FROM posts_group WHERE id = new.group_id)
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update
+    AFTER UPDATE OF text, author_id, group_id ON posts_post BEGIN
+        UPDATE posts_post_fts SET
+            text = new.text,
+            username = (SELECT username FROM auth_user
+                        WHERE id = new.author_id),
+            group_title = (SELECT title FROM posts_group
+                           WHERE id = new.group_id)
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_username
+    AFTER UPDATE OF username ON auth_user BEGIN
+        UPDATE posts_post_fts SET username = new.username
+        WHERE rowid IN (SELECT id FROM posts_post WHERE author_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_group_title
+    AFTER UPDATE OF title ON posts_group BEGIN
+        UPDATE posts_post_fts SET group_title = new.title
+        WHERE rowid IN (SELECT id FROM posts_post WHERE group_id = new.id);
+    END
+    """,
+]
+
+DROP_TRIGGERS_SQL = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_group_title',
+    'DROP TRIGGER IF EXISTS posts_post_fts_username',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+]
+
+
+def run_sqlite(statements):
+    """Функция для RunPython, выполняющая statements только в SQLite."""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
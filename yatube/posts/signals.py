@@ -0,0 +1,232 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache_versions import bump_generation
+from .counters import (shift_comments_counter, shift_group_counter,
+                       shift_user_counter)
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .lookups import forget_author, forget_group
+from .page_cache import ALL_PAGES, purge_pages, purge_profiles
+from .thumbnails import queue_thumbnails
+from .timeline import (backfill_timeline, fan_out_post, followers_changed,
+                       remove_from_timeline)
+
+
+@receiver(post_save, sender=Post)
+def post_fan_out(sender, instance, created, **kwargs):
+    if created:
+        fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_backfill(sender, instance, created, **kwargs):
+    if created:
+        backfill_timeline(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def unfollow_cleanup(sender, instance, **kwargs):
+    remove_from_timeline(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_posts_generation(sender, **kwargs):
+    bump_generation('posts')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comments_generation(sender, **kwargs):
+    bump_generation('comments')
+
+
+@receiver(post_save, sender=User)
+def bump_author_generations(sender, instance, created, raw, update_fields,
+                            **kwargs):
+    # Имя и username автора выводятся в карточках постов и комментариях.
+    # Вход сохраняет только last_login и ничего в них не меняет.
+    if created or raw or update_fields == {'last_login'}:
+        return
+    bump_generation('posts')
+    bump_generation('comments')
+    bump_generation(ALL_PAGES)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_generation(sender, instance, **kwargs):
+    bump_generation(f'follow:{instance.user_id}')
+    bump_generation('follows')
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, raw, **kwargs):
+    # Новая загрузка ещё не сохранена в хранилище: FileField.pre_save
+    # вызывается после сигнала.
+    instance._image_uploaded = bool(
+        instance.image and not instance.image._committed
+    )
+    if instance.pk and not raw:
+        instance._old_group_id, instance._old_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image')
+            .first()
+        ) or (None, None)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        shift_user_counter(instance.author_id, 'posts_count', 1)
+        shift_group_counter(instance.group_id, 1)
+        return
+    old_group_id = getattr(instance, '_old_group_id', instance.group_id)
+    if old_group_id != instance.group_id:
+        shift_group_counter(old_group_id, -1)
+        shift_group_counter(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    shift_user_counter(instance.author_id, 'posts_count', -1)
+    shift_group_counter(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        shift_comments_counter(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    shift_comments_counter(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        shift_user_counter(instance.author_id, 'followers_count', 1)
+        shift_user_counter(instance.user_id, 'following_count', 1)
+        followers_changed([instance.author_id], 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    shift_user_counter(instance.author_id, 'followers_count', -1)
+    shift_user_counter(instance.user_id, 'following_count', -1)
+    followers_changed([instance.author_id], -1)
+
+
+@receiver(post_save, sender=Post)
+def queue_post_thumbnails(sender, instance, created, raw, **kwargs):
+    if raw or not instance.image:
+        return
+    if created or instance.image.name != getattr(
+            instance, '_old_image', None):
+        queue_thumbnails(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, created, raw, **kwargs):
+    old_image = getattr(instance, '_old_image', None)
+    if created or raw or not old_image:
+        return
+    # Загрузка тех же байтов получает то же имя, но ссылку на файл
+    # добавляет, поэтому старая ссылка снимается и в этом случае.
+    if (old_image == instance.image.name
+            and not getattr(instance, '_image_uploaded', False)):
+        return
+    storage = instance.image.storage
+    transaction.on_commit(lambda: storage.delete(old_image))
+
+
+@receiver(post_delete, sender=Post)
+def release_post_image(sender, instance, **kwargs):
+    if instance.image:
+        image = instance.image
+        transaction.on_commit(lambda: image.storage.delete(image.name))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def purge_post_pages(sender, instance, **kwargs):
+    group_ids = {instance.group_id, getattr(instance, '_old_group_id', None)}
+    group_ids.discard(None)
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True
+    ) if group_ids else []
+    purge_pages(
+        'index',
+        f'profile:{instance.author.username}',
+        f'post:{instance.pk}',
+        *(f'group:{slug}' for slug in slugs),
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def purge_comment_pages(sender, instance, **kwargs):
+    purge_pages(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def purge_follow_pages(sender, instance, **kwargs):
+    purge_profiles(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=User)
+def purge_profile_pages(sender, instance, raw, **kwargs):
+    if not raw:
+        purge_pages(f'profile:{instance.username}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def purge_all_pages(sender, **kwargs):
+    bump_generation(ALL_PAGES)
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, raw, **kwargs):
+    if instance.pk and not raw:
+        instance._old_slug = (
+            Group.objects.filter(pk=instance.pk)
+            .values_list('slug', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def forget_cached_group(sender, instance, **kwargs):
+    forget_group(instance.slug, getattr(instance, '_old_slug', None))
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, raw, **kwargs):
+    if instance.pk and not raw:
+        instance._old_username = (
+            User.objects.filter(pk=instance.pk)
+            .values_list('username', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_author(sender, instance, **kwargs):
+    forget_author(
+        instance.username, getattr(instance, '_old_username', None)
+    )
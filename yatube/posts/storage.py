@@ -0,0 +1,123 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл называется SHA-256 своих байтов, поэтому повторная загрузка той же
+картинки не создаёт копию, а sorl находит уже построенные миниатюры по
+тому же имени. Число постов, ссылающихся на файл, хранится в StoredFile;
+файл и его миниатюры удаляются, когда ссылок не остаётся.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.apps import apps
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils.deconstruct import deconstructible
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+
+def stored_files():
+    # Модели импортируют хранилище, поэтому StoredFile берётся лениво.
+    return apps.get_model('posts', 'StoredFile').objects
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    hash_name = 'sha256'
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя выбирает _save по хэшу содержимого.
+        return name
+
+    def _save(self, name, content):
+        """Пишет файл во временный, считая хэш по тем же кускам, и
+        переносит его на место, только если таких байтов ещё нет.
+
+        Ссылка добавляется до проверки файла и в одной транзакции с ней:
+        release того же файла ждёт эту транзакцию и не удалит файл, уже
+        признанный существующим.
+        """
+        directory, basename = posixpath.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        upload_dir = self.path(directory)
+        os.makedirs(upload_dir, exist_ok=True)
+        digest = hashlib.new(self.hash_name)
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=upload_dir, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+                    size += len(chunk)
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(
+                directory, hexdigest[:2], hexdigest + extension
+            )
+            full_path = self.path(name)
+            with transaction.atomic():
+                self.add_reference(name, size)
+                if os.path.exists(full_path):
+                    os.remove(temp_path)
+                else:
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    os.replace(temp_path, full_path)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(full_path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def add_reference(self, name, size, count=1):
+        """Добавляет ссылки на файл в транзакции вызывающего кода: если
+        сохранение поста откатится, ссылки откатятся вместе с ним."""
+        files = stored_files()
+        with transaction.atomic():
+            files.bulk_create(
+                [files.model(name=name, size=size)], ignore_conflicts=True
+            )
+            files.filter(name=name).update(
+                references=F('references') + count
+            )
+
+    def delete(self, name):
+        self.release(name)
+
+    def release(self, name, count=1):
+        """Снимает ссылки на файл; файл удаляется вместе с последней.
+
+        Файлы без записи в StoredFile считаются единственной копией и
+        удаляются сразу.
+        """
+        references = stored_files().filter(name=name)
+        with transaction.atomic():
+            # UPDATE блокирует запись (в SQLite — базу) до конца
+            # транзакции: _save того же содержимого не добавит ссылку
+            # между проверкой счётчика и удалением файла.
+            if references.update(references=Greatest(
+                    F('references') - count, Value(0))):
+                remaining = (
+                    references.select_for_update()
+                    .values_list('references', flat=True).first()
+                )
+                if remaining:
+                    return
+                references.delete()
+            self.delete_file(name)
+
+    def delete_file(self, name):
+        try:
+            self.path(name)
+        except SuspiciousFileOperation:
+            # Путь вне MEDIA_ROOT (записан в пост напрямую): такой файл
+            # хранилищу не принадлежит.
+            return
+        default.kvstore.delete(ImageFile(name, self))
+        super().delete(name)
@@ -0,0 +1,21 @@
+from django import template
+
+from posts.thumbnails import cached_thumbnail as get_cached_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def cached_thumbnail(context, image, alias='card'):
+    """Готовая миниатюра картинки или None, если воркер её ещё не
+    построил.
+
+    Если view положил в контекст thumbnails (page_thumbnails), миниатюра
+    берётся оттуда, иначе KVStore опрашивается для одной картинки.
+    """
+    if not image:
+        return None
+    prefetched = context.get('thumbnails')
+    if prefetched and alias in prefetched:
+        return prefetched[alias].get(image.name)
+    return get_cached_thumbnail(image, alias)
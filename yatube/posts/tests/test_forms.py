@@ -1,14 +1,26 @@
+import hashlib
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
 
-from ..models import Comment, Group, Post
+from ..cache_versions import get_generation
+from ..models import Comment, Group, Post, StoredFile, ThumbnailJob
+from ..thumbnails import backend, prefetch_thumbnails, thumbnail_spec
 
 User = get_user_model()
 
@@ -142,10 +154,11 @@ class PostFormTests(TestCase):
             reverse('posts:profile', kwargs={'username': self.user.username})
         )
         self.assertEqual(Post.objects.count(), post_count + 1)
+        digest = hashlib.sha256(small_gif).hexdigest()
         self.assertTrue(
             Post.objects.filter(
                 text=form_data['text'],
-                image='posts/small.gif'
+                image=f'posts/{digest[:2]}/{digest}.gif'
             ).exists()
         )
 
@@ -170,3 +183,247 @@ class PostFormTests(TestCase):
                 text=form_data['text']
             ).exists()
         )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   POST_IMAGE_MAX_SIZE=(100, 100))
+class ImageNormalizationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='camera')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def get_photo(self, name='photo.jpg', size=(400, 200)):
+        """JPEG с EXIF, как с камеры."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        file_obj = BytesIO()
+        Image.effect_noise(size, 64).convert('RGB').save(
+            file_obj, 'jpeg', quality=100, exif=exif
+        )
+        return SimpleUploadedFile(name, file_obj.getvalue(), 'image/jpeg')
+
+    def test_upload_is_downscaled_and_stripped(self):
+        photo = self.get_photo()
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'С камеры', 'image': photo}
+        )
+        post = Post.objects.get(text='С камеры')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertFalse(image.getexif())
+        self.assertEqual(post.image_original_size, photo.size)
+        self.assertEqual(post.image_stored_size, post.image.size)
+        self.assertLess(post.image_stored_size, post.image_original_size)
+
+    def test_admin_add_post(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        url = reverse('admin:posts_post_add')
+        self.assertEqual(client.get(url).status_code, HTTPStatus.OK)
+        response = client.post(url, data={
+            'text': 'Из админки',
+            'author': self.user.pk,
+            'image': self.get_photo(),
+        })
+        self.assertRedirects(response, reverse('admin:posts_post_changelist'))
+        post = Post.objects.get(text='Из админки')
+        self.assertEqual(post.author, self.user)
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+
+    def test_normalize_images_command(self):
+        post = Post.objects.create(
+            text='Старая картинка', author=self.user,
+            image=self.get_photo('old.jpg')
+        )
+        old_name = post.image.name
+        names = ('posts', f'page:post:{post.pk}')
+        generations = [get_generation(name) for name in names]
+        call_command('normalize_images', batch_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        # Кэш со старой картинкой сброшен, хотя update() сигналов не шлёт.
+        for name, generation in zip(names, generations):
+            self.assertNotEqual(get_generation(name), generation)
+        self.assertFalse(post.image.storage.exists(old_name))
+        self.assertEqual(post.image_stored_size, post.image.size)
+        self.assertTrue(
+            ThumbnailJob.objects.filter(image=post.image.name).exists()
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class StorageDeduplicationTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reposter')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.content = self.get_png((0, 0, 255))
+
+    def get_png(self, color):
+        file_obj = BytesIO()
+        Image.new('RGB', size=(50, 50), color=color).save(file_obj, 'png')
+        return file_obj.getvalue()
+
+    def upload(self, text, name):
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': text, 'image': SimpleUploadedFile(
+                name, self.content, 'image/png'
+            )}
+        )
+        return Post.objects.get(text=text)
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.upload('Оригинал', 'photo.png')
+        second = self.upload('Репост', 'copy.png')
+        self.assertEqual(first.image.name, second.image.name)
+        stored = StoredFile.objects.get(name=first.image.name)
+        self.assertEqual(stored.references, 2)
+        self.assertEqual(stored.size, len(self.content))
+        self.assertEqual(ThumbnailJob.objects.count(), 1)
+
+        first.delete()
+        self.assertTrue(second.image.storage.exists(second.image.name))
+        second.delete()
+        self.assertFalse(second.image.storage.exists(second.image.name))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_failed_save_does_not_leak_reference(self):
+        """Ссылка на файл откатывается вместе с несохранённым постом."""
+        post = self.upload('Оригинал', 'photo.png')
+        with mock.patch('posts.signals.fan_out_post',
+                        side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Post.objects.create(
+                    text='Репост', author=self.user,
+                    image=SimpleUploadedFile('copy.png', self.content,
+                                             'image/png'),
+                )
+        self.assertFalse(Post.objects.filter(text='Репост').exists())
+        stored = StoredFile.objects.get(name=post.image.name)
+        self.assertEqual(stored.references, 1)
+        post.delete()
+        self.assertFalse(post.image.storage.exists(post.image.name))
+
+    def test_replaced_image_is_released(self):
+        post = self.upload('Пост', 'photo.png')
+        old_name = post.image.name
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Пост', 'image': SimpleUploadedFile(
+                'other.png', self.get_png((0, 255, 0)), 'image/png'
+            )}
+        )
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertFalse(post.image.storage.exists(old_name))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailQueueTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='photographer')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def get_image_file(self, name):
+        file_obj = BytesIO()
+        Image.new('RGB', size=(50, 50), color=(255, 0, 0)).save(
+            file_obj, 'png'
+        )
+        file_obj.seek(0)
+        return SimpleUploadedFile(name, file_obj.read(), 'image/png')
+
+    def test_upload_queues_thumbnails_for_worker(self):
+        """Картинка уходит в очередь, лента показывает заглушку,
+        пока воркер не построит миниатюру."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'С картинкой',
+                  'image': self.get_image_file('photo.png')}
+        )
+        post = Post.objects.get(text='С картинкой')
+        self.assertTrue(
+            ThumbnailJob.objects.filter(image=post.image.name).exists()
+        )
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'placeholder.svg')
+
+        call_command('process_thumbnails', stdout=StringIO())
+        self.assertFalse(ThumbnailJob.objects.exists())
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'placeholder.svg')
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+
+    def test_thumbnail_names_match_sorl(self):
+        """Имя, под которым страницы ищут миниатюру, совпадает с именем,
+        которое строит get_thumbnail sorl."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'С картинкой',
+                  'image': self.get_image_file('photo.png')}
+        )
+        image = Post.objects.get(text='С картинкой').image
+        for alias in settings.POST_THUMBNAILS:
+            geometry, options = thumbnail_spec(alias)
+            with self.subTest(alias=alias):
+                self.assertEqual(
+                    backend.get_thumbnail_file(
+                        image, geometry, **options
+                    ).name,
+                    get_thumbnail(image, geometry, **options).name,
+                )
+
+    def test_failed_job_is_retried_limited_times(self):
+        ThumbnailJob.objects.create(image='posts/photo.png')
+        with mock.patch('posts.thumbnails.get_thumbnail',
+                        side_effect=RuntimeError):
+            for _ in range(settings.THUMBNAIL_MAX_ATTEMPTS + 1):
+                call_command('process_thumbnails', stdout=StringIO())
+        job = ThumbnailJob.objects.get()
+        self.assertEqual(job.attempts, settings.THUMBNAIL_MAX_ATTEMPTS)
+
+    def test_page_thumbnails_are_fetched_in_one_query(self):
+        """Миниатюры страницы читаются из KVStore одним запросом."""
+        for number in range(3):
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': f'Картинка {number}',
+                      'image': self.get_image_file(f'photo{number}.png')}
+            )
+        call_command('process_thumbnails', stdout=StringIO())
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertNotContains(response, 'placeholder.svg')
+
+        posts = list(Post.objects.all())
+        with CaptureQueriesContext(connection) as queries:
+            thumbnails = prefetch_thumbnails(posts, 'card')
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(
+            set(thumbnails), {post.image.name for post in posts}
+        )
@@ -1,7 +1,15 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
 
-from ..models import Group, Post
+from ..models import (Comment, Follow, Group, Post, StoredFile, Timeline,
+                      UserStats)
 
 User = get_user_model()
 
@@ -50,3 +58,105 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.group2 = Group.objects.create(title='Группа 2', slug='group2')
+
+    def assertCounters(self, post):
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        user_stats = UserStats.objects.get(user=self.user)
+        reader_stats = UserStats.objects.get(user=self.reader)
+        self.assertEqual(post.comments_count, post.comments.count())
+        self.assertEqual(self.group.posts_count, self.group.posts.count())
+        self.assertEqual(user_stats.posts_count, self.user.posts.count())
+        self.assertEqual(user_stats.followers_count,
+                         self.user.following.count())
+        self.assertEqual(reader_stats.following_count,
+                         self.reader.follower.count())
+
+    def test_counters_follow_changes(self):
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   group=self.group)
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertCounters(post)
+        post.group = self.group2
+        post.save()
+        self.assertCounters(post)
+        Comment.objects.all().delete()
+        Follow.objects.all().delete()
+        self.assertCounters(post)
+
+    def test_recount_counters_fixes_drift(self):
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   group=self.group)
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        Post.objects.update(comments_count=7)
+        Group.objects.update(posts_count=7)
+        UserStats.objects.all().delete()
+        call_command('recount_counters', stdout=StringIO())
+        self.assertCounters(post)
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedCommandTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self, prefix):
+        call_command(
+            'seed_yatube', users=20, groups=3, posts=200, comments=300,
+            follows=60, images=2, seed=7, prefix=prefix, stdout=StringIO(),
+        )
+        posts = Post.objects.filter(author__username__startswith=prefix)
+        return list(
+            posts.order_by('pk').values_list(
+                'text', 'author__username', 'group__slug', 'image', 'pub_date'
+            )
+        )
+
+    def test_seed_is_deterministic(self):
+        first = self.seed('a')
+        second = self.seed('b')
+        self.assertEqual(len(first), 200)
+        self.assertEqual(
+            [(text, image, date) for text, _, _, image, date in first],
+            [(text, image, date) for text, _, _, image, date in second],
+        )
+        self.assertEqual(
+            [author[2:] for _, author, _, _, _ in first],
+            [author[2:] for _, author, _, _, _ in second],
+        )
+
+    def test_seed_keeps_derived_data_consistent(self):
+        self.seed('a')
+        self.assertEqual(Comment.objects.count(), 300)
+        for stats in UserStats.objects.all():
+            self.assertEqual(stats.posts_count,
+                             Post.objects.filter(author=stats.user).count())
+            self.assertEqual(stats.followers_count,
+                             Follow.objects.filter(author=stats.user).count())
+        for stored in StoredFile.objects.all():
+            self.assertEqual(stored.references,
+                             Post.objects.filter(image=stored.name).count())
+        follow = Follow.objects.first()
+        self.assertEqual(
+            Timeline.objects.filter(user=follow.user,
+                                    author=follow.author).count(),
+            Post.objects.filter(author=follow.author).count(),
+        )
+        self.assertFalse(Follow.objects.filter(
+            user_id=F('author_id')).exists())
@@ -1,10 +1,31 @@
+import json
+import tempfile
+from io import StringIO
+from unittest import mock
+
 from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Comment, Follow, Group, Post
+from ..cache_versions import get_generation
+from ..follow_graph import FOLLOWING_KEY, followed_author_ids
+from ..follows import follow_authors, unfollow_authors
+from ..management.commands.explain_views import (
+    Command as ExplainViewsCommand
+)
+from ..lookups import get_author_or_404, get_group_or_404
+from ..models import (Comment, Follow, Group, Post, ThumbnailJob, Timeline,
+                      UserStats)
+from ..thumbnails import process_thumbnail_jobs
+from ..timeline import timeline_page
 
 User = get_user_model()
 
@@ -123,12 +144,52 @@ class ViewsTests(TestCase):
         """Кэширование данных на главной странице работает корректно"""
         response = self.guest_client.get(self.pages[0])
         cached_response_content = response.content
-        Post.objects.create(text='Второй пост', author=self.user)
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
         response = self.guest_client.get(self.pages[0])
         self.assertEqual(cached_response_content, response.content)
-        cache.clear()
+        Post.objects.create(text='Второй пост', author=self.user)
         response = self.guest_client.get(self.pages[0])
         self.assertNotEqual(cached_response_content, response.content)
+        self.assertContains(response, 'Второй пост')
+
+    def test_author_rename_resets_fragments(self):
+        """Новое имя автора видно в ленте сразу, а вход на сайт
+        фрагменты не сбрасывает."""
+        response = self.authorized_client.get(self.pages[0])
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Станислав'
+        author.save()
+        response = self.authorized_client.get(self.pages[0])
+        self.assertContains(response, 'Станислав')
+        generation = get_generation('posts')
+        self.client.force_login(self.user2)
+        self.assertEqual(get_generation('posts'), generation)
+
+    def test_generations_shared_between_processes(self):
+        """Поколения лежат в общем кэше: их видит кэш другого процесса."""
+        other_process = FileBasedCache(
+            settings.CACHES['default']['LOCATION'], {}
+        )
+        Post.objects.create(text='Новый пост', author=self.user)
+        self.assertEqual(other_process.get('generation:posts'),
+                         get_generation('posts'))
+
+    def test_fragment_cache_varies_by_page_and_user(self):
+        """Фрагменты лент не отдаются на чужой странице и чужому читателю."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.user2) for i in range(10)
+        )
+        response1 = self.guest_client.get(self.pages[0])
+        response2 = self.guest_client.get(self.pages[0] + '?page=2')
+        self.assertNotEqual(response1.content, response2.content)
+        Follow.objects.create(user=self.user, author=self.user2)
+        reader = Client()
+        reader.force_login(self.user2)
+        follow_url = reverse('posts:follow_index')
+        response_author = self.authorized_client.get(follow_url)
+        response_reader = reader.get(follow_url)
+        self.assertContains(response_author, 'Пост 9')
+        self.assertNotContains(response_reader, 'Пост 9')
 
     def test_new_post_follow(self):
         """ Новая запись пользователя будет в ленте у тех кто на него
@@ -192,6 +253,105 @@ class ViewsTests(TestCase):
                                               author=self.user2).exists())
         self.assertEqual(Follow.objects.count(), follow_count + 1)
 
+    def test_follow_backfills_timeline(self):
+        """Подписка переносит посты автора в ленту, отписка убирает."""
+        Follow.objects.create(user=self.user2, author=self.user)
+        self.assertTrue(
+            Timeline.objects.filter(user=self.user2, post=self.post).exists()
+        )
+        Follow.objects.filter(user=self.user2, author=self.user).delete()
+        self.assertFalse(Timeline.objects.filter(user=self.user2).exists())
+
+    @override_settings(TIMELINE_MAX_LENGTH=1)
+    def test_timeline_is_capped(self):
+        """Лента подписок не длиннее TIMELINE_MAX_LENGTH."""
+        Follow.objects.create(user=self.user2, author=self.user)
+        Post.objects.create(author=self.user, text='Ещё один пост')
+        self.assertEqual(Timeline.objects.filter(user=self.user2).count(), 1)
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=0)
+    def test_heavy_author_read_from_posts(self):
+        """Посты популярных авторов подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.user, author=self.user2)
+        post = Post.objects.create(author=self.user2, text='Пост звезды')
+        self.assertFalse(Timeline.objects.filter(post=post).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'].object_list)
+
+    def test_fan_out_queries_do_not_grow_with_followers(self):
+        """Раздача поста обрезает ленты всех подписчиков одним запросом."""
+        for i in range(20):
+            Follow.objects.create(
+                user=User.objects.create(username=f'reader{i}'),
+                author=self.user2,
+            )
+        with self.assertNumQueries(5):
+            Post.objects.create(author=self.user2, text='Пост для всех')
+        self.assertEqual(Timeline.objects.filter(author=self.user2).count(),
+                         20)
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=1)
+    def test_timeline_page_merges_heavy_authors(self):
+        """Страницы ленты по курсору сливают Timeline и посты тяжёлых
+        авторов в одном порядке в обе стороны."""
+        star = User.objects.create(username='star')
+        Follow.objects.create(user=self.user2, author=star)
+        Follow.objects.create(user=self.user, author=star)
+        Follow.objects.create(user=self.user2, author=self.user)
+        for i in range(3):
+            Post.objects.create(author=star, text=f'Звезда {i}')
+            Post.objects.create(author=self.user, text=f'Автор {i}')
+        expected = list(
+            Post.objects.filter(author__in=[star, self.user])
+            .order_by('-pub_date', '-pk')
+        )
+        pages = [timeline_page(self.user2, post_per_page=3)]
+        while pages[-1].next_cursor:
+            pages.append(timeline_page(
+                self.user2, after=pages[-1].next_cursor, post_per_page=3
+            ))
+        self.assertEqual(
+            [post for page in pages for post in page], expected
+        )
+        back = timeline_page(
+            self.user2, before=pages[-1].previous_cursor, post_per_page=3
+        )
+        self.assertEqual(list(back), list(pages[-2]))
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=1)
+    def test_author_becoming_heavy_is_not_duplicated(self):
+        """Посты, разложенные до перехода автора через порог, не
+        дублируются постами из Post."""
+        Follow.objects.create(user=self.user2, author=self.user)
+        Post.objects.filter(author=self.user).delete()
+        Post.objects.create(author=self.user, text='before heavy')
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        self.assertFalse(Timeline.objects.filter(author=self.user).exists())
+        self.assertEqual(
+            [post.text for post in timeline_page(self.user2)],
+            ['before heavy']
+        )
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=1)
+    def test_author_back_under_threshold_is_refilled(self):
+        """Посты, вышедшие, пока автор был тяжёлым, раскладываются по
+        лентам, когда он возвращается под порог."""
+        Post.objects.filter(author=self.user).delete()
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=self.user2, author=self.user)
+        Follow.objects.create(user=reader, author=self.user)
+        Post.objects.create(author=self.user, text='while heavy')
+        Follow.objects.filter(user=reader).delete()
+        self.assertEqual(
+            [post.text for post in timeline_page(self.user2)],
+            ['while heavy']
+        )
+        self.assertTrue(
+            Timeline.objects.filter(user=self.user2, author=self.user)
+            .exists()
+        )
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -220,6 +380,7 @@ class PaginatorViewsTest(TestCase):
         ]
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -243,3 +404,559 @@ class PaginatorViewsTest(TestCase):
             response2 = self.authorized_client.get(page + '?page=2')
             self.assertEqual(len(response1.context['page_obj']), 10)
             self.assertEqual(len(response2.context['page_obj']), 3)
+
+    def test_cursor_pages(self):
+        """Курсорная пагинация листает ленту вперёд и назад."""
+        for page in self.pages:
+            with self.subTest(page=page):
+                response1 = self.guest_client.get(page)
+                page_obj = response1.context['page_obj']
+                self.assertIsNone(page_obj.previous_cursor)
+                response2 = self.guest_client.get(
+                    page + f'?after={page_obj.next_cursor}'
+                )
+                page_obj2 = response2.context['page_obj']
+                self.assertEqual(len(page_obj2), 3)
+                self.assertIsNone(page_obj2.next_cursor)
+                self.assertFalse(
+                    set(page_obj.object_list) & set(page_obj2.object_list)
+                )
+                response3 = self.guest_client.get(
+                    page + f'?before={page_obj2.previous_cursor}'
+                )
+                self.assertEqual(
+                    list(response3.context['page_obj']),
+                    list(page_obj)
+                )
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор отдаёт первую страницу."""
+        response = self.guest_client.get(self.pages[0] + '?after=broken')
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
+@override_settings(COMMENTS_PER_PAGE=3)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commentator')
+        cls.post = Post.objects.create(text='Популярный', author=cls.user)
+        for i in range(7):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}'
+            )
+
+    def test_comments_are_loaded_in_batches(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            ['Комментарий 6', 'Комментарий 5', 'Комментарий 4']
+        )
+        fragment_url = reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.pk}
+        )
+        seen = [comment.text for comment in comments]
+        cursor = comments.next_cursor
+        while cursor:
+            response = self.client.get(fragment_url, {'after': cursor})
+            self.assertTemplateUsed(response, 'posts/includes/comments.html')
+            self.assertNotContains(response, '<html')
+            comments = response.context['comments']
+            seen.extend(comment.text for comment in comments)
+            cursor = comments.next_cursor
+        self.assertEqual(seen, [f'Комментарий {i}' for i in range(6, -1, -1)])
+
+
+class FeedQueryBudgetTests(TestCase):
+    """Число запросов ленты не зависит от числа постов на странице."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        authors = [
+            User.objects.create_user(
+                username=f'author{i}', first_name='Имя', last_name=f'{i}'
+            )
+            for i in range(3)
+        ]
+        groups = [
+            Group.objects.create(title=f'Группа {i}', slug=f'group-{i}')
+            for i in range(3)
+        ]
+        for author in authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        for i in range(TEST_OF_POST):
+            Post.objects.create(
+                text=f'Пост {i}',
+                author=authors[i % 3],
+                group=groups[i % 3]
+            )
+        cls.author = authors[0]
+        cls.group = groups[0]
+        cls.post = Post.objects.filter(author=cls.author).first()
+        for i in range(6):
+            Comment.objects.create(
+                post=cls.post, author=authors[i % 3], text=f'Коммент {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_guest_feed_query_budget(self):
+        # Автор профиля и группа берутся из кэша поиска по username и
+        # slug, как на любом повторном заходе; счётчик постов группы
+        # читается отдельным запросом.
+        get_author_or_404(self.author.username)
+        get_group_or_404(self.group.slug)
+        budgets = {
+            reverse('posts:index'): 1,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}): 2,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 2,
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}): 2,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url), self.assertNumQueries(budget):
+                self.guest_client.get(url)
+
+    def test_follow_feed_query_budget(self):
+        # Подписки читателя загружаются один раз и дальше берутся из кэша.
+        followed_author_ids(self.reader.pk)
+        with self.assertNumQueries(4):
+            self.authorized_client.get(reverse('posts:follow_index'))
+
+    def test_warm_fragment_query_budget(self):
+        # Фрагмент из кэша экономит рендеринг и миниатюры, но не запрос
+        # страницы: page_obj должен быть Page и читается во view. Кроме
+        # него остаются сессия и пользователь, в ленте подписок ещё
+        # проверка тяжёлых авторов.
+        followed_author_ids(self.reader.pk)
+        budgets = {
+            reverse('posts:index'): 3,
+            reverse('posts:follow_index'): 4,
+        }
+        for url, budget in budgets.items():
+            self.authorized_client.get(url)
+            with self.subTest(url=url), self.assertNumQueries(budget):
+                self.authorized_client.get(url)
+
+    def test_explain_views_uses_feed_indexes(self):
+        """Лента главной читается по индексу без сортировки во временном
+        B-дереве."""
+        with tempfile.NamedTemporaryFile(suffix='.json') as report_file:
+            call_command('explain_views', json=report_file.name,
+                         stdout=StringIO())
+            with open(report_file.name, encoding='utf-8') as file:
+                report = json.load(file)
+        index_plan = next(
+            query for query in report[0]['queries']
+            if 'posts_post' in query['sql']
+        )
+        self.assertIn('post_pub_date', ' '.join(index_plan['after']))
+        self.assertNotIn('TEMP B-TREE', ' '.join(index_plan['after']))
+        self.assertIn('TEMP B-TREE', ' '.join(index_plan['before']))
+        views = {view['view'] for view in report}
+        self.assertNotIn('profile_follow', views)
+        self.assertNotIn('add_comment', views)
+
+    def test_explain_views_reports_query_count_mismatch(self):
+        """Планы не сопоставляются, если без индексов запросов другое
+        число."""
+        after = [('index', '/', [('SELECT 1', ['A']), ('SELECT 2', ['B'])])]
+        before = [('index', '/', [('SELECT 1', ['C'])])]
+        with mock.patch.object(ExplainViewsCommand, 'capture_plans',
+                               side_effect=[after, before]):
+            with tempfile.NamedTemporaryFile(suffix='.json') as report_file:
+                call_command('explain_views', json=report_file.name,
+                             stdout=StringIO())
+                with open(report_file.name, encoding='utf-8') as file:
+                    report = json.load(file)
+        self.assertIn('mismatch', report[0])
+        self.assertEqual(
+            [query['before'] for query in report[0]['queries']], [None, None]
+        )
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+        cls.other_post = Post.objects.create(text='Другой',
+                                             author=cls.other)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list', kwargs={'slug': 'group'}),
+            'author': reverse('posts:profile',
+                              kwargs={'username': 'author'}),
+            'other': reverse('posts:profile',
+                             kwargs={'username': 'other'}),
+            'post': reverse('posts:post_detail',
+                            kwargs={'post_id': self.post.pk}),
+            'other_post': reverse('posts:post_detail',
+                                  kwargs={'post_id': self.other_post.pk}),
+        }
+        for url in self.urls.values():
+            self.guest_client.get(url)
+
+    def assertCached(self, *names):
+        for name in names:
+            with self.subTest(page=name), self.assertNumQueries(0):
+                self.guest_client.get(self.urls[name])
+
+    def assertPurged(self, *names):
+        for name in names:
+            with self.subTest(page=name):
+                response = self.guest_client.get(self.urls[name])
+                self.assertIsNotNone(response.context)
+
+    def test_new_post_purges_its_pages_only(self):
+        self.assertCached(*self.urls)
+        Post.objects.create(text='Новый', author=self.author,
+                            group=self.group)
+        self.assertPurged('index', 'group', 'author')
+        self.assertCached('other', 'post', 'other_post')
+
+    def test_comment_purges_post_page_only(self):
+        Comment.objects.create(post=self.post, author=self.other,
+                               text='Комментарий')
+        self.assertPurged('post')
+        self.assertCached('index', 'group', 'author', 'other_post')
+
+    def test_thumbnails_purge_pages_of_their_posts_only(self):
+        Post.objects.filter(pk=self.post.pk).update(image='posts/photo.png')
+        ThumbnailJob.objects.create(image='posts/photo.png')
+        with mock.patch('posts.thumbnails.get_thumbnail'):
+            process_thumbnail_jobs(workers=1)
+        self.assertPurged('index', 'group', 'author', 'post')
+        self.assertCached('other', 'other_post')
+
+    def test_authorized_user_bypasses_cache(self):
+        client = Client()
+        client.force_login(self.other)
+        response = client.get(self.urls['index'])
+        self.assertIsNotNone(response.context)
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_follow_set_is_cached_and_kept_current(self):
+        self.assertEqual(followed_author_ids(self.reader.pk), frozenset())
+        with self.assertNumQueries(0):
+            followed_author_ids(self.reader.pk)
+        self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertEqual(
+            followed_author_ids(self.reader.pk), {self.author.pk}
+        )
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'author'})
+        )
+        self.assertTrue(response.context['following'])
+        self.client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'author'})
+        )
+        self.assertEqual(followed_author_ids(self.reader.pk), frozenset())
+
+    def test_late_write_of_old_set_is_not_served(self):
+        """Множество, собранное до подписки и записанное после неё,
+        ложится под старое поколение."""
+        generation = get_generation(f'follow:{self.reader.pk}')
+        Follow.objects.create(user=self.reader, author=self.author)
+        cache.set(FOLLOWING_KEY.format(self.reader.pk, generation),
+                  frozenset())
+        self.assertEqual(
+            followed_author_ids(self.reader.pk), {self.author.pk}
+        )
+
+
+class WritePathTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}')
+            for i in range(3)
+        ]
+        cls.post = Post.objects.create(text='Пост', author=cls.authors[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_repeated_follow_is_idempotent(self):
+        url = reverse('posts:profile_follow', kwargs={'username': 'author0'})
+        for _ in range(2):
+            cache.clear()
+            self.client.get(url)
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.authors[0]).followers_count, 1
+        )
+        self.assertTrue(
+            Timeline.objects.filter(user=self.reader, post=self.post)
+            .exists()
+        )
+        url = reverse('posts:profile_unfollow',
+                      kwargs={'username': 'author0'})
+        for _ in range(2):
+            response = self.client.get(url)
+            self.assertRedirects(
+                response,
+                reverse('posts:profile', kwargs={'username': 'author0'})
+            )
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(
+            UserStats.objects.get(user=self.authors[0]).followers_count, 0
+        )
+
+    def following_key(self):
+        return FOLLOWING_KEY.format(
+            self.reader.pk, get_generation(f'follow:{self.reader.pk}')
+        )
+
+    def test_stale_follow_set_does_not_block_writes(self):
+        author = self.authors[0]
+        Follow.objects.create(user=self.reader, author=author)
+        # Множество подписок в кэше отстало от базы.
+        cache.set(self.following_key(), frozenset())
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': 'author0'}))
+        self.assertFalse(Follow.objects.exists())
+        cache.set(self.following_key(), frozenset([author.pk]))
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': 'author0'}))
+        self.assertTrue(Follow.objects.filter(author=author).exists())
+        self.assertEqual(
+            UserStats.objects.get(user=author).followers_count, 1
+        )
+
+    def test_bulk_follow_counts_only_new_rows(self):
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        follow_authors(self.reader.pk, [a.pk for a in self.authors])
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 3
+        )
+        self.assertEqual(
+            [UserStats.objects.get(user=a).followers_count
+             for a in self.authors],
+            [1, 1, 1]
+        )
+        unfollow_authors(self.reader.pk, [a.pk for a in self.authors])
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 0
+        )
+        self.assertFalse(Timeline.objects.filter(user=self.reader).exists())
+
+    def test_bulk_follow_and_unfollow(self):
+        url = reverse('posts:follow_bulk')
+        response = self.client.post(
+            url, {'usernames': 'author0, author1\nauthor2 reader missing'}
+        )
+        self.assertEqual(response.json()['following'], 3)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 3
+        )
+        self.client.post(
+            url, {'usernames': 'author1 author2', 'action': 'unfollow'}
+        )
+        self.assertEqual(
+            list(Follow.objects.values_list('author__username', flat=True)),
+            ['author0']
+        )
+
+    def test_add_comment_does_not_load_post(self):
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.pk})
+        self.client.get(reverse('posts:index'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {'text': 'Комментарий'})
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT "posts_post"."id", ')
+            and '"posts_post"."text"' in query['sql']
+        ])
+        self.assertEqual(self.post.comments.count(), 1)
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': 10 ** 6}),
+            {'text': 'Мимо'}
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class LookupCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.user = User.objects.create_user(username='author')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lookups_are_cached_and_invalidated(self):
+        get_group_or_404('group')
+        get_author_or_404('author')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_group_or_404('group'), self.group)
+            self.assertEqual(get_author_or_404('author'), self.user)
+        self.group.slug = 'renamed'
+        self.group.save()
+        with self.assertRaises(Http404):
+            get_group_or_404('group')
+        self.assertEqual(get_group_or_404('renamed').slug, 'renamed')
+
+    def test_group_counter_is_not_cached(self):
+        """Счётчик постов группы читается из базы, а не из кэша."""
+        get_group_or_404('group')
+        Post.objects.create(text='Пост', author=self.user, group=self.group)
+        self.assertEqual(get_group_or_404('group').posts_count, 1)
+
+    def test_unknown_slug_is_negatively_cached(self):
+        with self.assertRaises(Http404):
+            get_group_or_404('new')
+        with self.assertNumQueries(0), self.assertRaises(Http404):
+            get_group_or_404('new')
+        Group.objects.create(title='Новая', slug='new')
+        self.assertEqual(get_group_or_404('new').title, 'Новая')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_unchanged_page_returns_304_without_queries(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:profile', kwargs={'username': 'reader'}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_data_and_user(self):
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        self.assertNotEqual(self.authorized_client.get(url)['ETag'], etag)
+        Comment.objects.create(post=self.post, author=self.user, text='!')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+
+    def test_relogin_invalidates_etag(self):
+        """После нового входа страница с формой не отдаётся как 304:
+        в ней был бы старый токен CSRF."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.authorized_client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.authorized_client.force_login(self.user)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.authorized_client.cookies['csrftoken'] = 'x' * 64
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Пушкин')
+        cls.group = Group.objects.create(title='Поэзия', slug='poetry')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Я помню чудное мгновенье',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Мгновенье номер {i}',
+                 group=cls.group)
+            for i in range(TEST_OF_POST)
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_search_by_text_author_and_group(self):
+        """Поиск находит посты по тексту, автору и группе."""
+        url = reverse('posts:search')
+        cases = {
+            'чудное': 1,
+            'ЧУДН': 1,
+            'пушкин': 10,
+            'поэзия мгновенье': 10,
+            'нет-такого': 0,
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                response = self.guest_client.get(url, {'q': query})
+                self.assertEqual(len(response.context['page_obj']), expected)
+
+    def test_search_cursor_and_sync(self):
+        """Выдача листается курсором и следует за изменениями постов."""
+        url = reverse('posts:search')
+        response = self.guest_client.get(url, {'q': 'мгновенье'})
+        page_obj = response.context['page_obj']
+        response2 = self.guest_client.get(
+            url, {'q': 'мгновенье', 'after': page_obj.next_cursor}
+        )
+        page_obj2 = response2.context['page_obj']
+        self.assertEqual(len(page_obj2), 4)
+        self.assertFalse(set(page_obj) & set(page_obj2))
+        Post.objects.filter(pk=self.post.pk).update(text='Другой текст')
+        response = self.guest_client.get(url, {'q': 'чудное'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+        self.group.title = 'Лирика'
+        self.group.save()
+        response = self.guest_client.get(url, {'q': 'лирика'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_admin_search_uses_fts(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        response = client.get('/admin/posts/post/', {'q': 'чудное'})
+        self.assertEqual(response.context['cl'].result_count, 1)
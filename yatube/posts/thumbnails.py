@@ -0,0 +1,208 @@
+"""Фоновая генерация миниатюр картинок постов.
+
+Сохранение поста с новой картинкой ставит её в очередь ThumbnailJob,
+команда process_thumbnails разбирает очередь пулом потоков и строит
+миниатюры всех размеров из POST_THUMBNAILS. Шаблоны берут только уже
+готовые миниатюры из KVStore sorl и не декодируют оригиналы в запросе.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.utils.functional import SimpleLazyObject
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .cache_versions import bump_generation
+from .models import Post, ThumbnailJob
+from .page_cache import purge_posts
+
+logger = logging.getLogger(__name__)
+
+
+class CachedThumbnailBackend(ThumbnailBackend):
+    """Имена миниатюр без их построения.
+
+    Публичный get_thumbnail строит миниатюру, если её нет, а запросу
+    страницы этого делать нельзя. Поэтому имя вычисляется частными
+    _get_format и _get_thumbnail_filename ThumbnailBackend; sorl-thumbnail
+    закреплён в requirements.txt на 12.6.3, и совпадение имён с
+    get_thumbnail проверяет тест ThumbnailQueueTests.
+    """
+
+    def get_thumbnail_file(self, file_, geometry_string, **options):
+        """ImageFile будущей миниатюры; само изображение не строится.
+
+        Опции дополняются так же, как в ThumbnailBackend.get_thumbnail,
+        чтобы имя миниатюры совпало с тем, что строит воркер.
+        """
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_cached_thumbnail(self, file_, geometry_string, **options):
+        """Миниатюра из KVStore или None."""
+        thumbnail = self.get_thumbnail_file(file_, geometry_string, **options)
+        return stored_thumbnails({thumbnail.name: thumbnail}).get(
+            thumbnail.name
+        )
+
+
+backend = CachedThumbnailBackend()
+
+
+def thumbnail_spec(alias):
+    geometry, options = settings.POST_THUMBNAILS[alias]
+    return geometry, dict(options)
+
+
+def cached_thumbnail(image, alias):
+    geometry, options = thumbnail_spec(alias)
+    return backend.get_cached_thumbnail(image, geometry, **options)
+
+
+def prefetch_thumbnails(posts, alias):
+    """Готовые миниатюры картинок страницы: {имя картинки: ImageFile}.
+
+    Вместо запроса к KVStore на каждый пост делает один get_many в кэш
+    и один запрос в базу за ключами, которых в кэше не оказалось.
+    Картинки без готовой миниатюры в словарь не попадают.
+    """
+    geometry, options = thumbnail_spec(alias)
+    thumbnails = {}
+    for post in posts:
+        if post.image and post.image.name not in thumbnails:
+            thumbnails[post.image.name] = backend.get_thumbnail_file(
+                post.image, geometry, **options
+            )
+    return stored_thumbnails(thumbnails)
+
+
+def stored_thumbnails(thumbnails):
+    """Готовые миниатюры из {имя картинки: ImageFile миниатюры}.
+
+    Промах запоминается в кэше только на THUMBNAIL_MISS_TIMEOUT, а не на
+    THUMBNAIL_CACHE_TIMEOUT, как в KVStore.get: если воркер записал
+    миниатюру между чтением базы и записью промаха, заглушка пропадёт
+    после этого срока.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        found = {
+            name: kvstore.get(thumbnail)
+            for name, thumbnail in thumbnails.items()
+        }
+        return {name: image for name, image in found.items() if image}
+    keys = {
+        add_prefix(thumbnail.key): name
+        for name, thumbnail in thumbnails.items()
+    }
+    if not keys:
+        return {}
+    values = kvstore.cache.get_many(list(keys))
+    missing = [key for key in keys if key not in values]
+    if missing:
+        stored = dict(
+            KVStoreModel.objects.filter(key__in=missing)
+            .values_list('key', 'value')
+        )
+        kvstore.cache.set_many(
+            stored, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        kvstore.cache.set_many(
+            {
+                key: cached_db_kvstore.EMPTY_VALUE
+                for key in missing if key not in stored
+            },
+            settings.THUMBNAIL_MISS_TIMEOUT,
+        )
+        values.update(stored)
+    return {
+        keys[key]: deserialize_image_file(value)
+        for key, value in values.items()
+        if value != cached_db_kvstore.EMPTY_VALUE
+    }
+
+
+def page_thumbnails(posts):
+    """Ленивые prefetch_thumbnails по каждому размеру для контекста view.
+
+    Запросы выполняются при первом обращении шаблона, так что страница,
+    отданная из фрагментного кэша, за миниатюрами не ходит.
+    """
+    return {
+        alias: SimpleLazyObject(partial(prefetch_thumbnails, posts, alias))
+        for alias in settings.POST_THUMBNAILS
+    }
+
+
+def queue_thumbnails(*image_names):
+    ThumbnailJob.objects.bulk_create(
+        [ThumbnailJob(image=name) for name in image_names if name],
+        ignore_conflicts=True,
+    )
+
+
+def generate_thumbnails(image_name):
+    """Строит миниатюры всех размеров; True, если задачу можно снять."""
+    # Ключ sorl включает хранилище: берём то же, что у поля Post.image,
+    # иначе страницы не найдут построенные миниатюры.
+    source = ImageFile(image_name, Post.image.field.storage)
+    try:
+        for alias in settings.POST_THUMBNAILS:
+            geometry, options = thumbnail_spec(alias)
+            get_thumbnail(source, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры %s', image_name)
+        return False
+    finally:
+        connection.close()
+    return True
+
+
+def process_thumbnail_jobs(batch_size=100, workers=None):
+    """Обрабатывает одну пачку очереди, возвращает число задач в ней.
+
+    Неудачные задачи остаются в очереди до THUMBNAIL_MAX_ATTEMPTS попыток.
+    """
+    jobs = list(
+        ThumbnailJob.objects.filter(
+            attempts__lt=settings.THUMBNAIL_MAX_ATTEMPTS
+        ).values_list('pk', 'image')[:batch_size]
+    )
+    if not jobs:
+        return 0
+    workers = workers or settings.THUMBNAIL_WORKERS
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(
+            pool.map(generate_thumbnails, [image for _, image in jobs])
+        )
+    done = [pk for (pk, _), ok in zip(jobs, results) if ok]
+    failed = [pk for (pk, _), ok in zip(jobs, results) if not ok]
+    if done:
+        ThumbnailJob.objects.filter(pk__in=done).delete()
+        bump_generation('thumbnails')
+        purge_posts(Post.objects.filter(image__in=[
+            image for (_, image), ok in zip(jobs, results) if ok
+        ]))
+    ThumbnailJob.objects.filter(pk__in=failed).update(
+        attempts=F('attempts') + 1
+    )
+    return len(jobs)
@@ -0,0 +1,287 @@
+"""Лента подписок с раздачей постов при записи (fan-out-on-write).
+
+Новый пост копируется в ленты всех подписчиков автора, поэтому чтение
+ленты сводится к выборке по индексу (user, -pub_date). Для авторов с
+числом подписчиков больше TIMELINE_FANOUT_MAX_FOLLOWERS раздача не
+выполняется, их посты подмешиваются при чтении (fan-out-on-read).
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from .follow_graph import followed_author_ids
+from .models import FEED_FIELDS, Follow, Post, Timeline, UserStats
+from .utils import CursorPaginator, decode_cursor
+
+# Колонки записи ленты и поста для карточки, читаемые одним запросом.
+ENTRY_FIELDS = ('post_id', 'pub_date') + tuple(
+    f'post__{field}' for field in FEED_FIELDS
+)
+
+
+def heavy_author_ids(author_ids):
+    """Авторы, чьи посты не раздаются по лентам при записи."""
+    return set(
+        UserStats.objects.filter(
+            user_id__in=author_ids,
+            followers_count__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+        ).values_list('user_id', flat=True)
+    )
+
+
+def trim_timeline(user_id):
+    """Обрезает ленту читателя до TIMELINE_MAX_LENGTH записей."""
+    keep = (
+        Timeline.objects.filter(user_id=user_id)
+        .order_by('-pub_date', '-post_id')
+        .values('pk')[:settings.TIMELINE_MAX_LENGTH]
+    )
+    Timeline.objects.filter(user_id=user_id).exclude(pk__in=keep).delete()
+
+
+TRIM_FOLLOWER_TIMELINES_SQL = """
+    DELETE FROM {timeline} WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY user_id
+                ORDER BY pub_date DESC, post_id DESC
+            ) AS position
+            FROM {timeline}
+            WHERE user_id IN (
+                SELECT user_id FROM {follow} WHERE author_id = %s
+            )
+        ) entries
+        WHERE position > %s
+    )
+"""
+
+
+def trim_follower_timelines(author_id):
+    """Обрезает ленты всех подписчиков автора одним DELETE."""
+    sql = TRIM_FOLLOWER_TIMELINES_SQL.format(
+        timeline=Timeline._meta.db_table,
+        follow=Follow._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [author_id, settings.TIMELINE_MAX_LENGTH])
+
+
+FAN_OUT_SQL = """
+    INSERT INTO {timeline} (user_id, post_id, author_id, pub_date)
+    SELECT user_id, %s, author_id, %s FROM {follow}
+    WHERE author_id = %s
+    ON CONFLICT DO NOTHING
+"""
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Порог проверяется по счётчику подписчиков, а сами подписчики не
+    читаются в Python: записи ленты вставляет один INSERT ... SELECT.
+    """
+    if heavy_author_ids([post.author_id]):
+        return
+    sql = FAN_OUT_SQL.format(
+        timeline=Timeline._meta.db_table,
+        follow=Follow._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [post.pk, post.pub_date, post.author_id])
+        if cursor.rowcount:
+            trim_follower_timelines(post.author_id)
+
+
+def backfill_timeline(user_id, author_id):
+    """Добавляет в ленту читателя последние посты нового автора."""
+    if heavy_author_ids([author_id]):
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date', '-pk')
+        .values_list('pk', 'pub_date')[:settings.TIMELINE_MAX_LENGTH]
+    )
+    Timeline.objects.bulk_create(
+        [
+            Timeline(user_id=user_id, post_id=post_id,
+                     author_id=author_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ],
+        ignore_conflicts=True,
+    )
+    trim_timeline(user_id)
+
+
+FILL_TIMELINES_SQL = """
+    INSERT INTO {timeline} (user_id, post_id, author_id, pub_date)
+    SELECT user_id, post_id, author_id, pub_date FROM (
+        SELECT f.user_id, p.id AS post_id, p.author_id, p.pub_date,
+               ROW_NUMBER() OVER (
+                   PARTITION BY f.user_id
+                   ORDER BY p.pub_date DESC, p.id DESC
+               ) AS position
+        FROM {follow} f
+        JOIN {post} p ON p.author_id = f.author_id
+        LEFT JOIN {stats} s ON s.user_id = f.author_id
+        WHERE f.user_id BETWEEN %s AND %s
+          AND COALESCE(s.followers_count, 0) <= %s
+    ) entries
+    WHERE position <= %s
+    ON CONFLICT DO NOTHING
+"""
+
+
+def fill_timelines(min_user_id, max_user_id):
+    """Собирает ленты читателей с id в [min_user_id, max_user_id] одним
+    INSERT ... SELECT, без построчного backfill_timeline.
+
+    Рассчитано на читателей с пустыми лентами (начальное наполнение
+    базы); счётчики подписчиков должны быть уже пересчитаны.
+    """
+    sql = FILL_TIMELINES_SQL.format(
+        timeline=Timeline._meta.db_table,
+        follow=Follow._meta.db_table,
+        post=Post._meta.db_table,
+        stats=UserStats._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            min_user_id, max_user_id,
+            settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+            settings.TIMELINE_MAX_LENGTH,
+        ])
+        return cursor.rowcount
+
+
+REFILL_AUTHOR_SQL = """
+    INSERT INTO {timeline} (user_id, post_id, author_id, pub_date)
+    SELECT f.user_id, p.id, p.author_id, p.pub_date
+    FROM {follow} f
+    JOIN (
+        SELECT id, author_id, pub_date FROM {post}
+        WHERE author_id = %s
+        ORDER BY pub_date DESC, id DESC
+        LIMIT %s
+    ) p ON p.author_id = f.author_id
+    WHERE f.author_id = %s
+    ON CONFLICT DO NOTHING
+"""
+
+
+def refill_author_timelines(author_id):
+    """Раскладывает последние посты автора по лентам всех подписчиков."""
+    sql = REFILL_AUTHOR_SQL.format(
+        timeline=Timeline._meta.db_table,
+        follow=Follow._meta.db_table,
+        post=Post._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql, [author_id, settings.TIMELINE_MAX_LENGTH, author_id]
+        )
+    trim_follower_timelines(author_id)
+
+
+def followers_changed(author_ids, delta):
+    """Перестраивает ленты, если счётчик подписчиков автора после сдвига
+    на delta пересёк TIMELINE_FANOUT_MAX_FOLLOWERS.
+
+    Посты ставшего тяжёлым автора читаются из Post, и его записи в
+    Timeline удаляются. Посты, вышедшие, пока автор был тяжёлым, в
+    ленты не раздавались, поэтому при возврате под порог они
+    раскладываются заново.
+    """
+    limit = settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    counts = UserStats.objects.filter(user_id__in=author_ids).values_list(
+        'user_id', 'followers_count'
+    )
+    for author_id, count in counts:
+        was_heavy, is_heavy = count - delta > limit, count > limit
+        if is_heavy and not was_heavy:
+            Timeline.objects.filter(author_id=author_id).delete()
+        elif was_heavy and not is_heavy:
+            refill_author_timelines(author_id)
+
+
+def remove_from_timeline(user_id, author_id):
+    """Убирает из ленты читателя посты автора, от которого он отписался."""
+    Timeline.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def timeline_posts(user):
+    """Посты ленты подписок читателя одним queryset.
+
+    Такой запрос не читает Timeline по индексу и сортирует посты во
+    временном B-дереве, поэтому нужен только номерной пагинации старых
+    ссылок; страницы по курсору строит timeline_page.
+    """
+    in_timeline = Q(
+        pk__in=Timeline.objects.filter(user=user).values('post_id')
+    )
+    author_ids = followed_author_ids(user.pk)
+    heavy_ids = heavy_author_ids(author_ids) if author_ids else set()
+    if heavy_ids:
+        in_timeline |= Q(author_id__in=heavy_ids)
+    return Post.objects.filter(in_timeline)
+
+
+def merge_cursor_pages(paginator, pages, backwards):
+    """Сливает страницы нескольких источников в одну по ключу (дата, id).
+
+    backwards — страницы собраны по курсору before: из всех строк нужны
+    ближайшие к курсору, то есть самые старые.
+    """
+    # Пост может прийти из двух источников, если автор пересёк порог
+    # между чтением счётчика и чтением страниц.
+    unique = {post.pk: post for page in pages for post in page}
+    rows = sorted(
+        unique.values(),
+        key=lambda post: (post.pub_date, post.pk),
+        reverse=True,
+    )
+    per_page = paginator.per_page
+    has_next = any(page.next_cursor for page in pages)
+    has_previous = any(page.previous_cursor for page in pages)
+    if backwards:
+        has_previous = has_previous or len(rows) > per_page
+        rows = rows[-per_page:]
+    else:
+        has_next = has_next or len(rows) > per_page
+        rows = rows[:per_page]
+    return paginator.cursor_page(rows, has_next, has_previous)
+
+
+def timeline_page(user, after=None, before=None, post_per_page=10):
+    """Страница ленты подписок по курсору (дата, id поста).
+
+    Записи ленты читаются диапазоном по индексу timeline_user_pub_date
+    и сразу соединяются с постами; сортировка и LIMIT идут по Timeline.
+    Посты тяжёлых авторов, которых в Timeline нет, берутся отдельной
+    страницей по post_author_pub_date и сливаются с записями ленты.
+    """
+    author_ids = followed_author_ids(user.pk)
+    heavy_ids = heavy_author_ids(author_ids) if author_ids else set()
+    entries = (
+        Timeline.objects.filter(user=user)
+        .select_related('post__author', 'post__group')
+        .only(*ENTRY_FIELDS)
+    )
+    if heavy_ids:
+        # Записи, разложенные до того, как автор стал тяжёлым, читаются
+        # вместе с его постами из Post.
+        entries = entries.exclude(author_id__in=heavy_ids)
+    page = CursorPaginator(
+        entries, post_per_page, pk_field='post_id'
+    ).get_cursor_page(after=after, before=before)
+    page.object_list = [entry.post for entry in page.object_list]
+    if not heavy_ids:
+        return page
+    paginator = CursorPaginator(
+        Post.objects.filter(author_id__in=heavy_ids).for_feed(),
+        post_per_page,
+    )
+    heavy_page = paginator.get_cursor_page(after=after, before=before)
+    return merge_cursor_pages(
+        paginator, [page, heavy_page],
+        backwards=decode_cursor(before) is not None,
+    )
@@ -1,7 +1,130 @@
-from django.core.paginator import Paginator
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .models import Comment
+
+CURSOR_SEPARATOR = '|'
+
+
+def encode_cursor(obj, key_field='pub_date', pk_field='pk'):
+    """Упаковывает ключ (дата, id) объекта или строки values() в
+    непрозрачный токен."""
+    if isinstance(obj, dict):
+        key = obj[key_field]
+        pk = obj['id' if pk_field == 'pk' else pk_field]
+    else:
+        key, pk = getattr(obj, key_field), getattr(obj, pk_field)
+    raw = f'{key.isoformat()}{CURSOR_SEPARATOR}{pk}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(token):
+    """Возвращает (pub_date, id) из токена или None, если токен битый."""
+    if not token:
+        return None
+    try:
+        raw = urlsafe_base64_decode(token).decode()
+        pub_date, pk = raw.rsplit(CURSOR_SEPARATOR, 1)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except ValueError:
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (дата, id) без COUNT(*) и OFFSET.
+
+    Стоимость любой страницы равна стоимости первой: в запрос попадает
+    только условие на ключ и LIMIT per_page + 1. Дата берётся из поля
+    key_field, по умолчанию pub_date постов, id — из pk_field.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, key_field='pub_date',
+                 pk_field='pk', **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.key_field = key_field
+        self.pk_field = pk_field
+
+    def get_cursor_page(self, after=None, before=None):
+        field, pk_field = self.key_field, self.pk_field
+        key = decode_cursor(before)
+        if key is not None:
+            date, pk = key
+            rows = list(
+                self.object_list.filter(
+                    Q(**{f'{field}__gt': date})
+                    | Q(**{field: date, f'{pk_field}__gt': pk})
+                ).order_by(field, pk_field)[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            key = decode_cursor(after)
+            queryset = self.object_list.order_by(f'-{field}', f'-{pk_field}')
+            if key is not None:
+                date, pk = key
+                queryset = queryset.filter(
+                    Q(**{f'{field}__lt': date})
+                    | Q(**{field: date, f'{pk_field}__lt': pk})
+                )
+            rows = list(queryset[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = key is not None
+        return self.cursor_page(rows, has_next, has_previous)
+
+    def cursor_page(self, rows, has_next, has_previous):
+        field, pk_field = self.key_field, self.pk_field
+        page = Page(rows, 1, self)
+        page.next_cursor = (
+            encode_cursor(rows[-1], field, pk_field)
+            if has_next and rows else None
+        )
+        page.previous_cursor = (
+            encode_cursor(rows[0], field, pk_field)
+            if has_previous and rows else None
+        )
+        return page
 
 
 def paginator_func(request, post_list, post_per_page=10):
-    paginator = Paginator(post_list, post_per_page)
+    """Постраничный вывод ленты.
+
+    По умолчанию используется курсорная пагинация (?after=/?before=).
+    Номерная пагинация (?page=) оставлена для старых ссылок.
+    """
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if page_number is not None:
+        paginator = Paginator(post_list, post_per_page)
+        return paginator.get_page(page_number)
+    paginator = CursorPaginator(post_list, post_per_page)
+    return paginator.get_cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+
+
+def comments_page(post_id, after=None):
+    """Очередная порция комментариев поста, новые сверху.
+
+    Автор подтягивается тем же запросом, поэтому число запросов не
+    зависит от числа комментариев на странице.
+    """
+    comments = (
+        Comment.objects.filter(post_id=post_id)
+        .select_related('author')
+        .only('text', 'created', 'post_id', 'author__username')
+    )
+    paginator = CursorPaginator(
+        comments, settings.COMMENTS_PER_PAGE, key_field='created'
+    )
+    return paginator.get_cursor_page(after=after)
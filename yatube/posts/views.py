@@ -1,64 +1,120 @@
+import re
+from http import HTTPStatus
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.http import urlencode
+from django.views.decorators.http import require_POST
 
+from .cache_versions import feed_cache_version
+from .conditional import page_condition
+from .follow_graph import followed_author_ids, is_following
+from .follows import follow_authors, unfollow_authors
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import paginator_func
+from .lookups import get_author_or_404, get_group_or_404
+from .page_cache import cache_anonymous_page
+from .models import Post, User
+from .search import search_posts
+from .thumbnails import page_thumbnails
+from .timeline import timeline_page, timeline_posts
+from .utils import comments_page, paginator_func
+
+# Поколения данных, из которых собраны карточки постов.
+FEED_GENERATIONS = ('posts', 'comments', 'thumbnails')
 
 
+@page_condition(*FEED_GENERATIONS)
+@cache_anonymous_page('index')
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.for_feed()
+    # Страница читается и тогда, когда фрагмент ленты возьмётся из
+    # кэша: page_obj в контексте — настоящий Page. Кэш фрагмента
+    # экономит рендеринг и миниатюры, они ленивые.
     page_obj = paginator_func(request, post_list)
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'thumbnails': page_thumbnails(page_obj),
+        'cache_version': feed_cache_version(request, *FEED_GENERATIONS),
     }
     return render(request, 'posts/index.html', context)
 
 
+@page_condition(*FEED_GENERATIONS)
+@cache_anonymous_page('group:{slug}')
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    group_list = group.posts.all()
+    group = get_group_or_404(slug)
+    group_list = group.posts.for_feed()
     page_obj = paginator_func(request, group_list)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'thumbnails': page_thumbnails(page_obj),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@page_condition(*FEED_GENERATIONS, 'follows', 'follow:{user}')
+@cache_anonymous_page('profile:{username}')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    user_posts = author.posts.all()
+    author = get_author_or_404(username)
+    user_posts = author.posts.for_feed()
     following = (
-        request.user.is_authenticated and author != request.user
-        and Follow.objects.filter(
-            user=request.user,
-            author=author
-        ).exists()
+        author != request.user and is_following(request.user, author.pk)
     )
     page_obj = paginator_func(request, user_posts)
     context = {
         'following': following,
         'page_obj': page_obj,
+        'thumbnails': page_thumbnails(page_obj),
         'author': author,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@page_condition(*FEED_GENERATIONS)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = search_posts(
+        Post.objects.for_feed(), query, after=request.GET.get('after')
+    )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'thumbnails': page_thumbnails(page_obj),
+        'cursor_query': urlencode({'q': query}),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@page_condition(*FEED_GENERATIONS)
+@cache_anonymous_page('post:{post_id}')
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    author_posts = post.author.posts.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
     form = CommentForm()
-    comments = post.comments.all()
+    comments = comments_page(post.pk, after=request.GET.get('after'))
     context = {
         'form': form,
         'comments': comments,
-        'author_posts': author_posts,
         'post': post,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@page_condition('comments')
+def post_comments(request, post_id):
+    """HTML-фрагмент со следующей порцией комментариев поста."""
+    comments = comments_page(post_id, after=request.GET.get('after'))
+    context = {
+        'comments': comments,
+        'post_id': post_id,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None,
@@ -95,41 +151,85 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
+        if not Post.objects.filter(pk=post_id).exists():
+            raise Http404
         comment.author = request.user
-        comment.post = post
+        # Пост целиком не нужен: комментарию хватает id.
+        comment.post_id = post_id
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@page_condition(*FEED_GENERATIONS, 'follow:{user}')
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator_func(request, post_list)
+    # Как в index, страница читается и при попадании во фрагмент.
+    if request.GET.get('page') is not None:
+        post_list = timeline_posts(request.user).for_feed()
+        page_obj = paginator_func(request, post_list)
+    else:
+        page_obj = timeline_page(
+            request.user,
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
     context = {
         'page_obj': page_obj,
+        'thumbnails': page_thumbnails(page_obj),
+        'cache_version': feed_cache_version(
+            request, *FEED_GENERATIONS, f'follow:{request.user.pk}'
+        ),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    if (author != request.user
-        and not Follow.objects.filter(user=request.user,
-                                      author=author).exists()):
-        Follow.objects.create(
-            user=request.user,
-            author=author,
-        )
+    author = get_author_or_404(username)
+    follow_authors(request.user.pk, [author.pk])
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    get_object_or_404(Follow, user=request.user,
-                      author__username=username).delete()
+    author = get_author_or_404(username)
+    unfollow_authors(request.user.pk, [author.pk])
     return redirect('posts:profile', username=username)
+
+
+@login_required
+@require_POST
+def follow_bulk(request):
+    """Импорт списка подписок: usernames через пробел, запятую или
+    перевод строки, action=follow|unfollow."""
+    action = request.POST.get('action', 'follow')
+    if action not in ('follow', 'unfollow'):
+        return JsonResponse(
+            {'detail': 'action: follow или unfollow'},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    usernames = set(
+        re.split(r'[\s,]+', request.POST.get('usernames', '').strip())
+    )
+    usernames.discard('')
+    if len(usernames) > settings.FOLLOW_BULK_MAX:
+        return JsonResponse(
+            {'detail': f'Не больше {settings.FOLLOW_BULK_MAX} авторов'},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    author_ids = set(
+        User.objects.filter(username__in=usernames)
+        .values_list('pk', flat=True)
+    )
+    if action == 'follow':
+        follow_authors(request.user.pk, author_ids)
+    else:
+        unfollow_authors(request.user.pk, author_ids)
+    return JsonResponse({
+        'action': action,
+        'authors': len(author_ids),
+        'following': len(followed_author_ids(request.user.pk)),
+    })
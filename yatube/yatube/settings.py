@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -49,22 +51,29 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.RepeatedQueriesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware'
 ]
 
+# Под нагрузкой debug_toolbar неприменим; в работе метрики собирает
+# core.middleware.RequestMetricsMiddleware и отдаёт /metrics/.
+if DEBUG:
+    INSTALLED_APPS += ['debug_toolbar']
+    MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware']
+
 
 ROOT_URLCONF = 'yatube.urls'
 
@@ -153,12 +162,74 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кэш на файлах общий для всех процессов сервера и обработчика миниатюр:
+# поколения фрагментов, подписки читателей и KVStore sorl должны
+# совпадать у всех воркеров, а LocMemCache у каждого процесса свой.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'yatube_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+COMMENTS_PER_PAGE = 20
+
+PAGE_CACHE_TIMEOUT = 300
+
+LOOKUP_CACHE_TIMEOUT = 3600
+
+LOOKUP_MISSING_TIMEOUT = 60
+
+FOLLOW_GRAPH_TIMEOUT = 300
+
+FOLLOW_BULK_MAX = 1000
+
+TIMELINE_MAX_LENGTH = 1000
+
+TIMELINE_FANOUT_MAX_FOLLOWERS = 5000
+
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+POST_IMAGE_MAX_SIZE = (1920, 1920)
+
+POST_IMAGE_FORMAT = 'JPEG'
+
+POST_IMAGE_QUALITY = 85
+
+THUMBNAIL_WORKERS = 4
+
+THUMBNAIL_MAX_ATTEMPTS = 3
+
+# Сколько секунд помнить, что миниатюры картинки ещё нет.
+THUMBNAIL_MISS_TIMEOUT = 60
+
+# Запросы дольше стольких секунд пишутся в SLOW_QUERY_LOG; None в любой
+# из двух настроек выключает журнал. Файл лежит вне дерева проекта.
+SLOW_QUERY_THRESHOLD = 0.1
+
+SLOW_QUERY_LOG = os.path.join(
+    tempfile.gettempdir(), 'yatube_slow_queries.log'
+)
+
+# Один и тот же запрос больше стольких раз за запрос к сайту считается
+# N+1; None выключает поиск. В тестах находка поднимает исключение.
+NPLUSONE_THRESHOLD = 5
+
+NPLUSONE_RAISE = False
+
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# Интервал снимков стека в режиме профилирования sample, секунды.
+PROFILE_SAMPLE_INTERVAL = 0.005
+
+# Сколько последних профилей запросов хранить.
+PROFILE_KEEP = 200
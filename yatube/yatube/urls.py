@@ -3,13 +3,17 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core import views as core_views
+
 handler404 = 'core.views.page_not_found'
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/', include('api.urls', namespace='api')),
     path('auth/', include('users.urls', namespace='users')),
     path('admin/', admin.site.urls),
+    path('metrics/', core_views.metrics, name='metrics'),
     path('auth/', include('django.contrib.auth.urls')),
 ]
 